@@ -20,7 +20,10 @@ const defaultValues = {
     max_checks: 10,
 }
 
-const ImageWrapper = (data) => <img src={`data:image/jpeg;base64,${data}`} />
+// charts are served by the server (/images), results hold their urls
+const imageUrl = (path) => path ? `http://${serverAddr}:${serverPort}${path}` : null
+
+const ImageWrapper = (path) => <img src={imageUrl(path)} />
 
 
 export const MainView = () => {
@@ -43,23 +46,67 @@ export const MainView = () => {
         });
     }
 
+    const [jobId, setJobId] = useState(null)
+    const poller = useRef(null)
+
+    // the search runs as a background job on the server: poll it until it is over
+    const stopPolling = () => {
+        clearInterval(poller.current)
+        poller.current = null
+    }
+
+    useEffect(() => stopPolling, [])
+
     const run = () => {
-        const url = `http://${serverAddr}:${serverPort}/run?depth=${formValues.depth}&soln_size=${formValues.soln_size}&initial_state_file=${formValues.initial_state_file}&gamma=${formValues.gamma}&threshold=${formValues.threshold}&sched_threshold=${formValues.sched_threshold}&k=${formValues.k}&beam_width=${formValues.beam_width}&max_checks=${formValues.max_checks}`;
+        const url = `http://${serverAddr}:${serverPort}/jobs?depth=${formValues.depth}&soln_size=${formValues.soln_size}&initial_state_file=${formValues.initial_state_file}&gamma=${formValues.gamma}&threshold=${formValues.threshold}&sched_threshold=${formValues.sched_threshold}&k=${formValues.k}&beam_width=${formValues.beam_width}&max_checks=${formValues.max_checks}`;
+        stopPolling()
         fetch(url, {
-            method: "GET",
+            method: "POST",
         })
             .then(res => res.json())
-            .then(json => {
-                // console.log(json.text)
-                // console.log(json.image1)     
-                // setResultText(json.text)
-                setImg1(json.image1)
-                setImg2(json.image2)
-                setImg3(json.image3)
-                setImg4(json.image4)
-                setImg5(json.image5)
+            .then(job => {
+                setJobId(job.id)
+                setResultText("Queued")
+                poller.current = setInterval(() => poll(job.id), 1000)
+                // cached results are done right away
+                if (job.status === "done") {
+                    poll(job.id)
+                }
+            })
+
+    }
+
+    const poll = (id) => {
+        fetch(`http://${serverAddr}:${serverPort}/jobs/${id}`)
+            .then(res => res.json())
+            .then(job => {
+                if (job.status === "queued" || job.status === "running" || job.status === "cancelling") {
+                    setResultText(`${job.status}: ${job.checked} / ${job.total} schedules checked`)
+                    return
+                }
+
+                stopPolling()
+                setJobId(null)
+                setResultText(job.status === "done" ? "" : job.status)
+                if (job.status === "done") {
+                    // console.log(json.text)
+                    // setResultText(json.text)
+                    setImg1(job.result.image1)
+                    setImg2(job.result.image2)
+                    setImg3(job.result.image3)
+                    setImg4(job.result.image4)
+                    setImg5(job.result.image5)
+                }
             })
+    }
 
+    const cancel = () => {
+        if (jobId === null) {
+            return
+        }
+        fetch(`http://${serverAddr}:${serverPort}/jobs/${jobId}/cancel`, {
+            method: "POST",
+        })
     }
 
     const clear = () => {
@@ -158,6 +205,7 @@ export const MainView = () => {
 
 
                 <Button onClick={run}>Run</Button>
+                <Button onClick={cancel} disabled={jobId === null}>Cancel</Button>
                 <Button onClick={clear}>Clear</Button>
                 <Button onClick={reset}>Reset</Button>
 
@@ -166,11 +214,11 @@ export const MainView = () => {
 
             <div>
                 {resultText}
-                <img src={`data:image/jpeg;base64,${img1}`} width="1200" height="700" />
-                <img src={`data:image/jpeg;base64,${img2}`} width="1200" height="700" />
-                <img src={`data:image/jpeg;base64,${img3}`} width="1200" height="700" />
-                <img src={`data:image/jpeg;base64,${img4}`} width="1200" height="700" />
-                <img src={`data:image/jpeg;base64,${img5}`} width="1200" height="700" />
+                {img1 && <img src={imageUrl(img1)} width="1200" height="700" />}
+                {img2 && <img src={imageUrl(img2)} width="1200" height="700" />}
+                {img3 && <img src={imageUrl(img3)} width="1200" height="700" />}
+                {img4 && <img src={imageUrl(img4)} width="1200" height="700" />}
+                {img5 && <img src={imageUrl(img5)} width="1200" height="700" />}
             </div>
         </div >
     );
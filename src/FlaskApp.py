@@ -12,10 +12,9 @@ author: Richard White
 
 # %%
 import os
-import copy
 import pickle
 
-from flask import Flask, request
+from flask import Flask, Response, request, url_for
 from flask_cors import CORS
 
 import policy
@@ -23,35 +22,63 @@ from node import Node
 import visualize
 import mathfunctions
 
-from traverse import traverse_node
+from traverse import run_rollouts
+from sampler import sampler_map
+from profiling import Profiler, profile_modes
+from jobs import JobPool
+from resultcache import ResultCache
 
 
 app = Flask(__name__)
 CORS(app)
 
 
-@app.route('/run', methods=['GET', 'POST'])
-def run():
+# search parameters of a request (/run, /jobs)
+def request_params(args) -> dict:
+    sampler: str = args.get('sampler', default='batched', type=str)
+    profile: str = args.get('profile', default=None, type=str)
+
+    return {
+        'depth': args.get('depth', default=3, type=int),
+        'soln_size': args.get('soln_set_size', default=5, type=int),
+        'initial_state_file': args.get('initial_state_file', default=1, type=int),
+        'gamma': args.get('gamma', default=0.95, type=float),
+        'threshold': args.get('threshold', default=0.5, type=float),
+        'sched_threshold': args.get('schedule_threshold', default=0.5, type=float),
+        'k': args.get('k', default=1., type=float),
+        'beam_width': args.get('beam_width', default=5250, type=int),
+        'max_checks': args.get('max_checks', default=10, type=int),
+        'compact': args.get('compact', default=False, type=lambda v: v.lower() in ('1', 'true')),
+        'workers': args.get('workers', default=1, type=int),
+        'seed': args.get('seed', default=None, type=int),
+        'sampler': sampler if sampler in sampler_map else 'batched',
+        'unique': args.get('unique', default=False, type=lambda v: v.lower() in ('1', 'true')),
+        'profile': profile if profile in profile_modes else None,
+        'save': args.get('save', default=False, type=lambda v: v.lower() in ('1', 'true')),
+    }
 
-    depth: int = request.args.get('depth', default=3, type=int)
-    soln_size: int = request.args.get('soln_set_size', default=5, type=int)
-    initial_state_file: int = request.args.get(
-        'initial_state_file', default=1, type=int)
-    gamma: float = request.args.get('gamma', default=0.95, type=float)
-    threshold: float = request.args.get('threshold', default=0.5, type=float)
-    sched_threshold: float = request.args.get(
-        'schedule_threshold', default=0.5, type=float)
-    k: float = request.args.get('k', default=1., type=float)
-    beam_width: int = request.args.get('beam_width', default=5250, type=int)
-    max_checks: int = request.args.get('max_checks', default=10, type=int)
+
+# runs the search and renders its results, in the request (/run) or in a job worker process (/jobs):
+# the schedules text, and their charts as PNG bytes (images), also written to output_dir if save is set.
+# progress and cancel: see traverse.run_rollouts. Returns None if cancelled
+def schedule(params: dict, progress=None, cancel=None) -> dict:
+    depth: int = params['depth']
+    initial_state_file: int = params['initial_state_file']
+    gamma: float = params['gamma']
+    threshold: float = params['threshold']
+    k: float = params['k']
+    beam_width: int = params['beam_width']
+    max_checks: int = params['max_checks']
+    profile: str = params['profile']
 
     output_dir = f'schedules/schedule-mstochastic-d{depth}-i{initial_state_file}-g{gamma}-k{k}-b{beam_width}-c{max_checks}-t{threshold}'
     if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
 
     Node.gamma = gamma
     Node.threshold = threshold
-    Node.sched_threshold = sched_threshold
+    Node.sched_threshold = params['sched_threshold']
+    Node.compact = params['compact']
     mathfunctions.k = k
 
     #
@@ -62,53 +89,151 @@ def run():
     # Collections of Nodes which represent viable solutions (depth achieved)
     #  solutions contain the World State, history of transactions,
     # and Utility function/measure of State quality at given step.
-    top_solutions = []
-    min_eu = -1.
-
     policy.reload_policy()
 
     # instantiate a root node
     root: Node = Node()
 
-    for i in range(max_checks):
-        print(f"Iter: {i}")
+    profiler: Profiler = Profiler(profile, output_dir) if profile else None
+    if profiler:
+        profiler.start()
 
-        policy.reset_policy_checks()
-        soln: Node = traverse_node(copy.deepcopy(root), depth)
+    top_solutions: list = run_rollouts(root, depth, max_checks, params['soln_size'],
+                                       workers=params['workers'], seed=params['seed'],
+                                       sampler=params['sampler'], unique=params['unique'],
+                                       progress=progress, cancel=cancel)
 
-        # don't bother putting in top solutions if cannot contend with the min expected utility already in the top_solutions
-        if len(top_solutions) < soln_size or soln.calc_expected_utility() >= min_eu:
+    profile_files: list = profiler.stop() if profiler else []
 
-            top_solutions.append(soln)  # add solution to "top solutions"
-            top_solutions.sort(key=lambda n: n.calc_expected_utility(),
-                               reverse=True)  # sort top solutions
-            while len(top_solutions) > soln_size:  # only keep the X best solutions
-                removed_soln = top_solutions.pop()
-            min_eu = min([soln.calc_expected_utility()
-                          for soln in top_solutions])
+    if cancel and cancel.is_set():
+        return None
 
     # Store Soltions in a 'pickled' list to learn from
+    # (written then renamed: jobs may finish at the same time)
     soln_pickle = "soln.pickle"
-    with open(soln_pickle, 'wb') as outfile:
+    with open(f'{soln_pickle}.{os.getpid()}', 'wb') as outfile:
         pickle.dump(top_solutions, outfile)
+    os.replace(f'{soln_pickle}.{os.getpid()}', soln_pickle)
 
-    visualize.print_schedules(output_dir, top_solutions, max_checks)
+    visualize.print_schedules(output_dir, top_solutions, max_checks, plot=False)
 
     resp: dict = {
-        'text': visualize.get_schedules(top_solutions, max_checks)
+        'text': visualize.get_schedules(top_solutions, max_checks),
+        'images': [visualize.render_schedule(soln, f'{output_dir}-{i+1}') for i, soln in enumerate(top_solutions)],
     }
 
-    for i in range(len(top_solutions)):
-        resp[f'image{i+1}'] = visualize.get_response_image(
-            f'{output_dir}/schedule{i+1}.png')
+    if params['save']:
+        for i, image in enumerate(resp['images']):
+            with open(f'{output_dir}/schedule{i+1}.png', 'wb') as outfile:
+                outfile.write(image)
+
+    if profile_files:
+        resp['profile'] = profile_files
 
     return resp
 
 
+# json response of a result: its charts are served by /images (image1..imageN are their urls)
+def response(key: str, result: dict) -> dict:
+    images = result.get('images', 0)
+    resp: dict = {name: value for name, value in result.items() if name != 'images'}
+    for i in range(images if isinstance(images, int) else len(images)):
+        resp[f'image{i+1}'] = url_for('image', key=key, index=i+1)
+    return resp
+
+
+@app.route('/run', methods=['GET', 'POST'])
+def run():
+    params: dict = request_params(request.args)
+    result: dict = result_cache.get(params) if cacheable(params) and not force(request.args) else None
+    if result is None:
+        result = schedule(params)
+        return response(store(params, result), result)
+    return response(result_cache.key(params), result)
+
+
+@app.route('/images/<key>/<int:index>', methods=['GET'])
+def image(key: str, index: int):
+    png: bytes = result_cache.image(key, index)
+    if png is None:
+        return {'error': f'unknown image: {key}/{index}'}, 404
+    return Response(png, mimetype='image/png')
+
+
+'''
+Result cache: /run and /jobs results are kept per parameter set (see resultcache),
+force=1 runs the search again (and replaces the cached result).
+Profiled runs are never cached, only their charts are kept (in memory) for a while.
+The charts of every result are kept there, and served by /images/<key>/<index>
+'''
+
+result_cache: ResultCache = ResultCache(max_size=int(os.environ.get('RESULT_CACHE_SIZE', 32)))
+
+
+def cacheable(params: dict) -> bool:
+    return params['profile'] is None
+
+
+# caches a result (profiled results only keep their charts in memory), returns the key of its charts
+def store(params: dict, result: dict) -> str:
+    return result_cache.put(params, result) if cacheable(params) else result_cache.keep(result)
+
+
+def force(args) -> bool:
+    return args.get('force', default=False, type=lambda v: v.lower() in ('1', 'true'))
+
+
+'''
+Jobs: the search runs in a background worker process (see jobs), the request returns right away
+POST /jobs                  submit a search (same parameters as /run, and force), returns its id
+                            (a job with a cached result is done right away)
+GET /jobs/<id>              status, progress (rollouts checked out of max_checks) and, once done, the results
+POST /jobs/<id>/cancel      cancel a queued job, or stop a running search
+'''
+
+job_pool: JobPool = JobPool(schedule, workers=int(os.environ.get('JOB_WORKERS', 2)))
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    params: dict = request_params(request.args)
+    result: dict = result_cache.get(params) if cacheable(params) and not force(request.args) else None
+    if result is not None:
+        return {'id': job_pool.completed(params, result, total=params['max_checks'],
+                                         stored=result_cache.key(params)), 'status': 'done'}, 202
+
+    job_id: str = job_pool.submit(params, total=params['max_checks'], callback=store)
+    return {'id': job_id, 'status': 'queued'}, 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    job: dict = job_pool.get(job_id)
+    if job is None:
+        return {'error': f'unknown job: {job_id}'}, 404
+    return job_response(job)
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id: str):
+    job: dict = job_pool.cancel(job_id)
+    if job is None:
+        return {'error': f'unknown job: {job_id}'}, 404
+    return job_response(job)
+
+
+def job_response(job: dict) -> dict:
+    if 'result' in job:
+        job['result'] = response(job['stored'], job['result'])
+    return job
+
+
 @app.route('/clear', methods=['POST'])
 def clear():
     if os.path.exists("soln.pickle"):
         os.remove("soln.pickle")
+    # results depend on the policy learned from soln.pickle
+    result_cache.clear()
     return ""
 
 
@@ -0,0 +1,246 @@
+'''
+
+Benchmark Suite -
+
+Runs fixed (seeded) configurations of main.py (DFS/UCS) and main-stochastic.py headless,
+across initial state files 1-4 and several depths.
+Every run is a separate process in a fresh temporary directory (no soln.pickle policy, no shared output).
+
+Records per run: wall time, search time (metrics.json), nodes generated (Node.id), peak RSS,
+best Expected Utility and the top schedules.
+
+Checks:
+reference   - the optimized engines (default, --compact, root-parallel, batched sampler) return the same
+              top schedules as the reference implementation (--reference)
+baseline    - best EU and nodes generated are unchanged from the stored baseline, and reports the time/memory ratios
+
+Run from the repo root:
+    python src/benchmark.py                     run every configuration, compare against the stored baseline
+    python src/benchmark.py -k stochastic       only the configurations whose name contains 'stochastic'
+    python src/benchmark.py --save              store the results as the new baseline
+    python src/benchmark.py -o results.json     also write the results
+
+'''
+
+import os
+import sys
+import glob
+import json
+import math
+import time
+import runpy
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import namedtuple
+
+from topk import schedule_key
+
+
+src_dir: str = os.path.dirname(os.path.abspath(__file__))
+resources_dir: str = os.path.join(os.path.dirname(src_dir), 'resources')
+baseline_file: str = os.path.join(resources_dir, 'benchmark-baseline.json')
+
+
+'''
+Configurations:
+variants are extra arguments for the optimized engines, each checked against the --reference run.
+eu_variants are only checked on the top EUs: other search models may order schedules with equal EU differently
+'''
+
+Benchmark = namedtuple('Benchmark', ['name', 'script', 'args', 'variants', 'eu_variants'], defaults=[[]])
+
+
+def benchmarks() -> list:
+    suite: list = []
+    for i in range(1, 5):
+        suite += [
+            Benchmark(f'dfs-d2-i{i}', 'main.py',
+                      ['-m', 'DFS', '-d', '2', '-i', f'{i}', '-c', '1000'], [['--compact']]),
+            Benchmark(f'dfs-d3-i{i}', 'main.py',
+                      ['-m', 'DFS', '-d', '3', '-i', f'{i}', '-c', '1000'], [['--compact']]),
+            Benchmark(f'ucs-d2-i{i}', 'main.py',
+                      ['-m', 'UCS', '-d', '2', '-i', f'{i}', '-c', '1000'], [['--compact']]),
+            Benchmark(f'stochastic-d4-i{i}', 'main-stochastic.py',
+                      ['-d', '4', '-i', f'{i}', '-c', '10', '--seed', '1'], [['-w', '2'], ['--sampler', 'full']]),
+            Benchmark(f'stochastic-d8-i{i}', 'main-stochastic.py',
+                      ['-d', '8', '-i', f'{i}', '-c', '5', '--seed', '2'], []),
+        ]
+
+    # unlimited budgets (a narrow beam keeps it small), so the root-parallel search, the transposition table,
+    # the memory-bounded frontier and the other search models match the serial search
+    suite.append(Benchmark('dfs-d3-i3-b12-full', 'main.py',
+                           ['-m', 'DFS', '-d', '3', '-i', '3', '-b', '12', '-c', '100000000'],
+                           [['--compact'], ['-w', '2'], ['-tt', '100000'], ['-mm', '1'], ['-m', 'IDDFS']],
+                           [['-m', 'ASTAR'], ['-m', 'BEAM']]))
+    return suite
+
+
+'''
+Run a single configuration in a fresh directory, in its own process
+'''
+
+
+# peak resident set size of this process, in kB (linux only).
+# VmHWM rather than ru_maxrss: on linux a child's ru_maxrss also counts the (benchmark) process it was started from
+def peak_rss() -> int:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# run a script as __main__ in this process, then write its peak RSS and top solutions to result_file.
+# invoked in the benchmark's child process: python -c "import benchmark; benchmark.launch()" result_file script args
+# (the top solutions are summarized here: unpickling soln.pickle would load every ancestor/sibling Node)
+def launch():
+    result_file, script, *args = sys.argv[1:]
+    sys.argv = [script, *args]
+    script_globals: dict = runpy.run_path(script, run_name='__main__')
+
+    top_solutions: list = script_globals['top_solutions']
+    with open(result_file, 'w') as outfile:
+        json.dump({
+            'peak_rss_kb': peak_rss(),
+            'top': [{'eu': soln.calc_expected_utility(), 'schedule': schedule_key(soln.schedule)}
+                    for soln in top_solutions],
+        }, outfile)
+
+
+def run(script: str, args: list, timeout: float = 900.) -> dict:
+    with tempfile.TemporaryDirectory() as work:
+        shutil.copytree(resources_dir, os.path.join(work, 'resources'))
+
+        env: dict = dict(os.environ, MPLBACKEND='Agg', PYTHONPATH=src_dir)
+        log_file: str = os.path.join(work, 'output.txt')
+        result_file: str = os.path.join(work, 'result.json')
+
+        start: float = time.perf_counter()
+        with open(log_file, 'w') as log:
+            try:
+                process = subprocess.run([sys.executable, '-c', 'import benchmark; benchmark.launch()',
+                                          result_file, os.path.join(src_dir, script), *args, '--metrics'],
+                                         cwd=work, env=env, stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+                returncode: int = process.returncode
+            except subprocess.TimeoutExpired:
+                returncode = -1
+
+        result: dict = {
+            'returncode': returncode,
+            'wall': time.perf_counter() - start,
+            'peak_rss_kb': None,
+        }
+
+        with open(log_file) as log:
+            output: str = log.read()
+        if returncode != 0:
+            result['error'] = output[-2000:]
+            return result
+
+        with open(result_file) as infile:
+            result.update(json.load(infile))
+        result['best_eu'] = result['top'][0]['eu'] if result['top'] else None
+
+        metrics_files: list = glob.glob(os.path.join(work, 'schedules', '*', 'metrics.json'))
+        with open(metrics_files[0]) as infile:
+            metrics: dict = json.load(infile)
+        result['search'] = metrics['elapsed']
+        result['nodes'] = int(output.split('Total Nodes generated: ')[1].split()[0])
+
+        return result
+
+
+def same_schedules(top: list, reference: list) -> bool:
+    return len(top) == len(reference) and all(
+        t['schedule'] == r['schedule'] and math.isclose(t['eu'], r['eu'], rel_tol=1e-9, abs_tol=1e-9)
+        for t, r in zip(top, reference))
+
+
+def same_eus(top: list, reference: list) -> bool:
+    return len(top) == len(reference) and all(
+        math.isclose(t['eu'], r['eu'], rel_tol=1e-9, abs_tol=1e-9) for t, r in zip(top, reference))
+
+
+def ratio(value, baseline) -> str:
+    return f'{round(value / baseline, 2)}x' if value and baseline else '-'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark suite for the search engines')
+    parser.add_argument('--filter', '-k', type=str, default='',
+                        help='only run the configurations whose name contains this')
+    parser.add_argument('--baseline', '-b', type=str, default=baseline_file,
+                        help='baseline results to compare against')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the baseline (merged into the existing baseline)')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='write the results to this json file')
+    parser.add_argument('--no_reference', action='store_true',
+                        help='skip the reference/variant runs (timings only)')
+    args = parser.parse_args()
+
+    baseline: dict = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+
+    results: dict = {}
+    failures: list = []
+
+    for bench in benchmarks():
+        if args.filter not in bench.name:
+            continue
+
+        result: dict = run(bench.script, bench.args)
+        results[bench.name] = result
+        if result['returncode'] != 0:
+            failures.append(f'{bench.name}: exit code {result["returncode"]}')
+            print(f'{bench.name:<22} FAILED\n{result["error"]}')
+            continue
+
+        base: dict = baseline.get(bench.name, {})
+        status: str = ''
+        if base and (base['nodes'] != result['nodes'] or
+                     not math.isclose(base['best_eu'], result['best_eu'], rel_tol=1e-9, abs_tol=1e-9)):
+            status = 'CHANGED'
+            failures.append(f'{bench.name}: best EU/nodes changed from the baseline '
+                            f'({base["best_eu"]}/{base["nodes"]} -> {result["best_eu"]}/{result["nodes"]})')
+
+        if not args.no_reference:
+            reference: dict = run(bench.script, [*bench.args, '--reference'])
+            result['reference_search'] = reference.get('search')
+            for variant in [[], *bench.variants, *bench.eu_variants]:
+                top: list = result['top'] if not variant else run(
+                    bench.script, [*bench.args, *variant]).get('top')
+                same = same_eus if variant in bench.eu_variants else same_schedules
+                if top is None or not same(top, reference.get('top', [])):
+                    status = 'MISMATCH'
+                    failures.append(f'{bench.name} {" ".join(variant) or "(default)"}: '
+                                    f'top {"EUs" if same is same_eus else "schedules"} differ from the reference')
+
+        print(f'{bench.name:<22} wall: {round(result["wall"], 2):>7}s ({ratio(result["wall"], base.get("wall")):>6}) '
+              f'search: {round(result["search"], 3):>8}s ({ratio(result["search"], base.get("search")):>6}) '
+              f'nodes: {result["nodes"]:>8} '
+              f'peak RSS: {result["peak_rss_kb"]}kB ({ratio(result["peak_rss_kb"], base.get("peak_rss_kb")):>6}) '
+              f'best EU: {round(result["best_eu"], 3)} {status}')
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+
+    if args.save:
+        baseline.update({name: {key: r.get(key) for key in ('wall', 'search', 'nodes', 'peak_rss_kb', 'best_eu')}
+                         for name, r in results.items() if r['returncode'] == 0})
+        with open(args.baseline, 'w') as outfile:
+            json.dump(baseline, outfile, indent=2)
+        print(f'Baseline saved: {args.baseline}')
+
+    for failure in failures:
+        print(f'-- {failure}')
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,143 @@
+'''
+
+Expected Utility Bound -
+
+Admissible (optimistic) upper bound on the Expected Utility a node can still gain before the depth limit,
+used as the A* heuristic (see Node.calc_heuristic) by the branch-and-bound model (see search.branch_and_bound).
+
+The EU gained at step j is gamma^j * likelihood_j * (Q_j - Q_j-1), with a likelihood <= 1, so:
+    remaining EU <= sum over j of gamma^j * max(0, Q_hi(j) - Q_lo(j-1))
+Q_hi(j) bounds the quality of any state reachable by step j,
+Q_lo(j-1) is the node's own quality for the first step, and a lower bound on any reachable quality after that.
+
+Quality bounds (Country 0, see quality/goals) come from bounds on its quantities after s more actions,
+relaxed as if every action was taken at every step:
+- population (R1) is never traded, and given back by every template
+- a Transfer brings in one partner's holding of one tradable resource at most:
+  after s steps a resource is bounded by its own quantity plus the s largest partner holdings
+- templates are bounded by their inputs: alloys by R2/3, electronics by 2*R21/4, housing by min(R2, R3/5, R21/3)
+  (plus the factor of 1 a template always applies)
+then each goal is bounded by the quantities it grows with
+(housing and electronics progress are capped at full progress, waste progress is never positive).
+Resource weights are expected to be non-negative (see resources/example-resources.csv).
+
+'''
+
+from collections import Counter
+
+import numpy as np
+
+from mathfunctions import inv_logit_function
+
+
+def remaining_eu_bound(state, quality: float, node_depth: int, depth: int,
+                       gamma: float, transfer_resources: list) -> float:
+    if node_depth >= depth:
+        return 0.
+
+    table = state.table
+    ix: dict = table.index
+    quantities: np.ndarray = state.as_array().astype(float)
+    upper: np.ndarray = quantities[0].copy()
+
+    # largest partner holdings first, for each tradable resource
+    tradable: list = [ix[r] for r in transfer_resources]
+    partners: np.ndarray = -np.sort(-quantities[1:, tradable], axis=0)
+
+    bound: float = 0.
+    previous: float = quality  # lower bound on the quality the step starts from
+    for step in range(1, depth - node_depth + 1):
+        if step <= len(partners):
+            upper[tradable] += partners[step - 1]
+
+        # templates always apply a factor of at least 1
+        alloys: float = upper[ix['R2']] / 3 + 1
+        upper[ix['R21']] += alloys
+        upper[ix["R21'"]] += alloys
+        electronics: float = upper[ix['R21']] / 2 + 2
+        upper[ix['R22']] += electronics
+        upper[ix["R22'"]] += electronics
+        housing: float = min(upper[ix['R2']], upper[ix['R3']] / 5, upper[ix['R21']] / 3) + 1
+        upper[ix['R23']] += housing
+        upper[ix["R23'"]] += housing
+
+        bound += (gamma ** (node_depth + step)) * max(0., quality_upper_bound(upper, table) - previous)
+        previous = quality_lower_bound(upper, table)
+
+    return bound
+
+
+# bound on calc_quality, given upper bounds on each of Country 0's quantities
+def quality_upper_bound(upper: np.ndarray, table) -> float:
+    ix: dict = table.index
+    w: list = table.weight_list
+    r1: float = upper[ix['R1']]
+    r2, r3, r21, r22, r23 = (upper[ix[r]] for r in ('R2', 'R3', 'R21', 'R22', 'R23'))
+    if r1 <= 0:
+        return 0.
+
+    # EndHomelessness: increasing in housing, full progress once everyone is housed
+    housing_ratio: float = r23 / r1
+    housing: float = 0. if r23 <= 0 else w[ix['R23']] * r1 * \
+        (1 if housing_ratio >= 1 else inv_logit_function(housing_ratio))
+
+    # BalancedElectronics: no progress once electronics reach 5 per house, and the decay term is at most 1
+    electronics: float = w[ix['R22']] * min(r22, 5 * r23) * housing_ratio
+
+    # MinimalWaste: never positive
+
+    # ResourcesOnHand
+    on_hand: float = (r21 * w[ix['R21']] +
+                      r22 * w[ix['R22']] +
+                      r2 * (w[ix['R2']] + 0.1) +
+                      r3 * (w[ix['R3']] + 0.1) +
+                      r23 * w[ix['R23']]) / r1
+
+    return housing + electronics + on_hand
+
+
+# bound on calc_quality from below: only the waste goal is ever negative, at most 0.1 * weight per unit of waste
+def quality_lower_bound(upper: np.ndarray, table) -> float:
+    ix: dict = table.index
+    w: list = table.weight_list
+    return -sum(0.1 * upper[ix[r]] * w[ix[r]] for r in ("R21'", "R22'", "R23'"))
+
+
+'''
+Skip Report:
+how much of the (beam trimmed) tree branch and bound never expanded.
+Subtree sizes are estimated from the mean branching factor seen at each depth.
+'''
+
+
+class SkipReport:
+
+    def __init__(self, depth: int):
+        self.depth: int = depth
+        self.expansions: Counter = Counter()  # depth -> nodes expanded
+        self.successors: Counter = Counter()  # depth -> successors (after the beam, before any cut)
+        self.cuts: Counter = Counter()  # depth -> subtrees cut
+
+    def expanded(self, depth: int, successors: int):
+        self.expansions[depth] += 1
+        self.successors[depth] += successors
+
+    def cut(self, depth: int, count: int = 1):
+        self.cuts[depth] += count
+
+    # estimated number of nodes in the subtree of a node at the given depth (itself included)
+    def subtree_size(self, depth: int) -> float:
+        size: float = 1.
+        width: float = 1.
+        for d in range(depth, self.depth):
+            width *= self.successors[d] / self.expansions[d] if self.expansions[d] else 0.
+            size += width
+        return size
+
+    def summary(self) -> str:
+        cut: int = sum(self.cuts.values())
+        skipped: float = sum(count * self.subtree_size(d) for d, count in self.cuts.items())
+        tree: float = self.subtree_size(0)
+        return f'Branch and bound: {cut} subtrees cut (by depth: {dict(sorted(self.cuts.items()))}), ' \
+            f'~{round(skipped)} of ~{round(tree)} nodes skipped ' \
+            f'({round(100 * skipped / tree, 1) if tree else 0.}% of the tree, estimated from the branching factor per depth)'
@@ -3,7 +3,13 @@ Country structure:
 
 County Name/Identifier, and Material Listing/Manifest each countries
 
+Countries are shared between World States (copy-on-write):
+A child state reuses its parent's Country objects, and only clones the ones its action mutates.
+Once shared, a Country is read-only - its resource listing can no longer be modified in place.
+
 '''
+from dataclasses import replace
+from types import MappingProxyType
 
 
 class Country:
@@ -12,10 +18,45 @@ class Country:
         self.name: str = ""
         self.resources: dict = {}
         self.printer = print
+        self.shared: bool = False
 
     # define a print out of the Country and their resource list
-    def print(self):
-        nl = '\n' if not self.printer == print else ''
-        self.printer(f'Country: {self.name} {nl}')
-        [self.printer(f'{r.name} : {r.quantity} \t--\t {r.descript} {nl}')
+    def print(self, printer=None):
+        printer = printer or self.printer
+        nl = '\n' if not printer == print else ''
+        printer(f'Country: {self.name} {nl}')
+        [printer(f'{r.name} : {r.quantity} \t--\t {r.descript} {nl}')
          for r in self.resources.values()]
+
+    # mark the Country as shared between World States. From here on it is read-only
+    def share(self):
+        if not self.shared:
+            self.shared = True
+            self.resources = MappingProxyType(self.resources)
+        return self
+
+    # private (mutable) copy of the Country. Resources are immutable, so only the listing is copied
+    def clone(self):
+        c: Country = Country()
+        c.name = self.name
+        c.resources = dict(self.resources)
+        c.printer = self.printer
+        return c
+
+    def add(self, resource_name: str, quantity: int):
+        if self.shared:
+            raise RuntimeError(
+                f'Country {self.name} is shared between world states and cannot be mutated in place')
+
+        r = self.resources[resource_name]
+        self.resources[resource_name] = replace(
+            r, quantity=r.quantity + quantity)
+
+    # MappingProxyType can't be pickled/deep-copied, so store the listing as a plain dict
+    def __getstate__(self):
+        return {**self.__dict__, 'resources': dict(self.resources)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared:
+            self.resources = MappingProxyType(self.resources)
@@ -19,6 +19,8 @@ apply:      "Pure" function taking in a given World State, and applies
 '''
 
 from abc import ABC, abstractmethod
+from collections import namedtuple
+import numpy as np
 
 from world import WorldState
 from country import Country
@@ -26,6 +28,15 @@ from resource import Resource
 from mathfunctions import sigmoid
 from goals import goal_map
 
+'''
+Action Record:
+Structured record of an Action taken on a schedule - the action id, the kwargs (proposition) it was applied with,
+and the factor returned by apply (None if the action was not viable).
+Text is only rendered from the record (see describe) when a schedule is actually printed.
+'''
+ActionRecord = namedtuple('ActionRecord', ['action', 'kwargs', 'factor'])
+
+
 # Uses abstract methods as a means to express some static polymorphism/Inheritence
 
 
@@ -45,6 +56,10 @@ class Action(ABC):
     def probability(self, state: WorldState, **kwargs) -> float:
         return 1.0
 
+    # human readable description of an applied action, given the factor returned by apply
+    def describe(self, state: WorldState, factor, **kwargs) -> str:
+        return f'{factor}'
+
 
 class Transform(Action):
 
@@ -69,24 +84,26 @@ preconditions are of the form ?ARj <= ?C(?Rj)
 class AlloyTemplate(Transform):
 
     def is_viable(self, world: WorldState, **kwargs):
-        c: Country = world.countries[0]
-        return c.resources['R1'].quantity >= 1 \
-            and c.resources['R2'].quantity >= 2
+        ix: dict = world.table.index
+        c: list = world.row(0)
+        return c[ix['R1']] >= 1 \
+            and c[ix['R2']] >= 2
 
     # returns the 'factor' applied for the given base operation/inputs
     def apply(self, world: WorldState, **kwargs) -> int:
-        c: Country = world.countries[0]
+        ix: dict = world.table.index
+        c: list = world.row(0)
 
         # use about 2/3 of resources on given transform
-        factor: int = max([1, int(c.resources['R2'].quantity / 3)])
+        factor: int = max([1, int(c[ix['R2']] / 3)])
 
         r2_consumed: int = factor * 2
         r21_gained: int = factor
         r21_waist_gained: int = factor
 
-        c.resources['R2'].quantity -= r2_consumed
-        c.resources['R21'].quantity += r21_gained
-        c.resources["R21'"].quantity += r21_waist_gained
+        world.add(0, ix['R2'], -r2_consumed)
+        world.add(0, ix['R21'], r21_gained)
+        world.add(0, ix["R21'"], r21_waist_gained)
 
         return factor
 
@@ -101,18 +118,20 @@ preconditions are of the form ?ARj <= ?C(?Rj)
 class ElectronicsTemplate(Transform):
 
     def is_viable(self, world: WorldState, **kwargs):
-        c: Country = world.countries[0]
-        return c.resources['R1'].quantity >= 3 \
-            and c.resources['R2'].quantity >= 2 \
-            and c.resources['R21'].quantity >= 2
+        ix: dict = world.table.index
+        c: list = world.row(0)
+        return c[ix['R1']] >= 3 \
+            and c[ix['R2']] >= 2 \
+            and c[ix['R21']] >= 2
 
     # returns the 'factor' applied for the given base operation/inputs
     def apply(self, world: WorldState, **kwargs) -> int:
-        c: Country = world.countries[0]
+        ix: dict = world.table.index
+        c: list = world.row(0)
 
         # use up to half of resources on given transform
-        r2_max_factor: int = max([1, int(c.resources['R2'].quantity / 4)])
-        r21_max_factor: int = max([1, int(c.resources['R21'].quantity / 4)])
+        r2_max_factor: int = max([1, int(c[ix['R2']] / 4)])
+        r21_max_factor: int = max([1, int(c[ix['R21']] / 4)])
 
         factor: int = min([r2_max_factor, r21_max_factor])
 
@@ -122,10 +141,10 @@ class ElectronicsTemplate(Transform):
         r22_gained: int = factor * 2
         r22_waist_gained: int = factor * 2
 
-        c.resources['R2'].quantity -= r2_consumed
-        c.resources['R21'].quantity -= r21_consumed
-        c.resources['R22'].quantity += r22_gained
-        c.resources["R22'"].quantity += r22_waist_gained
+        world.add(0, ix['R2'], -r2_consumed)
+        world.add(0, ix['R21'], -r21_consumed)
+        world.add(0, ix['R22'], r22_gained)
+        world.add(0, ix["R22'"], r22_waist_gained)
 
         return factor
 
@@ -140,20 +159,22 @@ preconditions are of the form ?AIk <= ?C(?Rk)
 class HousingTemplate(Transform):
 
     def is_viable(self, world: WorldState, **kwargs):
-        c: Country = world.countries[0]
-        return c.resources['R1'].quantity >= 5 \
-            and c.resources['R2'].quantity >= 1 \
-            and c.resources['R3'].quantity >= 5 \
-            and c.resources['R21'].quantity >= 3
+        ix: dict = world.table.index
+        c: list = world.row(0)
+        return c[ix['R1']] >= 5 \
+            and c[ix['R2']] >= 1 \
+            and c[ix['R3']] >= 5 \
+            and c[ix['R21']] >= 3
 
     # returns the 'factor' applied for the given base operation/inputs
     def apply(self, world: WorldState, **kwargs) -> int:
-        c: Country = world.countries[0]
+        ix: dict = world.table.index
+        c: list = world.row(0)
 
         # use up to half of resources on given transform
-        r2_max_factor: int = max([1, int(c.resources['R2'].quantity)])
-        r3_max_factor: int = max([1, int(c.resources['R3'].quantity / 5)])
-        r21_max_factor: int = max([1, int(c.resources['R21'].quantity / 3)])
+        r2_max_factor: int = max([1, int(c[ix['R2']])])
+        r3_max_factor: int = max([1, int(c[ix['R3']] / 5)])
+        r21_max_factor: int = max([1, int(c[ix['R21']] / 3)])
 
         factor: int = min([r2_max_factor, r3_max_factor, r21_max_factor])
 
@@ -164,12 +185,12 @@ class HousingTemplate(Transform):
         r23_gained: int = factor
         r23_waist_gained: int = factor
 
-        c.resources['R2'].quantity -= r2_consumed
-        c.resources['R3'].quantity -= r3_consumed
-        c.resources['R21'].quantity -= r21_consumed
+        world.add(0, ix['R2'], -r2_consumed)
+        world.add(0, ix['R3'], -r3_consumed)
+        world.add(0, ix['R21'], -r21_consumed)
 
-        c.resources['R23'].quantity += r23_gained
-        c.resources["R23'"].quantity += r23_waist_gained
+        world.add(0, ix['R23'], r23_gained)
+        world.add(0, ix["R23'"], r23_waist_gained)
 
         return factor
 
@@ -205,17 +226,18 @@ class Transfer(Action):
     # Ensure Both Parties of required resources for said transfer
     def is_viable(self, world: WorldState, **kwargs) -> bool:
 
+        ix: dict = world.table.index
         c1_idx: int = kwargs['c1']
         c2_idx: int = kwargs['c2']
 
-        c1: Country = world.countries[c1_idx]
+        c1: list = world.row(c1_idx)
         c1_offer: dict = kwargs['c1_offer']
-        c1_offer_rsrc: str = c1_offer['resource']
+        c1_offer_rsrc: int = ix[c1_offer['resource']]
         c1_offer_qty: int = int(c1_offer['quantity'])
 
-        c2: Country = world.countries[c2_idx]
+        c2: list = world.row(c2_idx)
         c2_offer: dict = kwargs['c2_offer']
-        c2_offer_rsrc: str = c2_offer['resource']
+        c2_offer_rsrc: int = ix[c2_offer['resource']]
         c2_offer_qty: int = int(c2_offer['quantity'])
 
         # abort if trade resource requirements are infeasible
@@ -223,11 +245,11 @@ class Transfer(Action):
             return False
 
         # c1 cannot attempt to trade more than c1's resource quantity
-        if c1_offer_qty > c1.resources[c1_offer_rsrc].quantity:
+        if c1_offer_qty > c1[c1_offer_rsrc]:
             return False
 
         # c2 cannot attempt to trade more than c1's resource quantity
-        if c2_offer_qty > c2.resources[c2_offer_rsrc].quantity:
+        if c2_offer_qty > c2[c2_offer_rsrc]:
             return False
 
         # # approximate a reasonable trade by assuming C1 cannot offer less than some threshold/ratio of C2s offer/value
@@ -241,54 +263,58 @@ class Transfer(Action):
         # return true if both Countries could 'feasibly' trade resource request
         return True
 
-    def apply(self, world: WorldState, **kwargs) -> str:
+    # returns the 'factor' applied: a single trade
+    def apply(self, world: WorldState, **kwargs) -> int:
 
+        ix: dict = world.table.index
         c1_idx: int = kwargs['c1']
         c2_idx: int = kwargs['c2']
 
-        c1: Country = world.countries[c1_idx]
         c1_offer: dict = kwargs['c1_offer']
         c1_offer_rsrc = c1_offer['resource']
         c1_offer_qty = int(c1_offer['quantity'])
 
-        c2: Country = world.countries[c2_idx]
         c2_offer: dict = kwargs['c2_offer']
         c2_offer_rsrc = c2_offer['resource']
         c2_offer_qty = int(c2_offer['quantity'])
 
         # Subtract resources from both countries, and then redistribute
-        c1.resources[c1_offer_rsrc].quantity -= c1_offer_qty
-        c2.resources[c2_offer_rsrc].quantity -= c2_offer_qty
+        world.add(c1_idx, ix[c1_offer_rsrc], -c1_offer_qty)
+        world.add(c2_idx, ix[c2_offer_rsrc], -c2_offer_qty)
 
         # reflect quantities:
-        c1.resources[c2_offer_rsrc].quantity += c2_offer_qty
-        c2.resources[c1_offer_rsrc].quantity += c1_offer_qty
+        world.add(c1_idx, ix[c2_offer_rsrc], c2_offer_qty)
+        world.add(c2_idx, ix[c1_offer_rsrc], c1_offer_qty)
 
-        print_line = f'C{c1_idx+1}:{c1.name}  ({c1_offer_rsrc} x {c1_offer_qty}) to C{c2_idx+1}:{c2.name}  ({c2_offer_rsrc} x {c2_offer_qty})'
+        return 1
+
+    def describe(self, world: WorldState, factor, **kwargs) -> str:
+        c1_idx: int = kwargs['c1']
+        c2_idx: int = kwargs['c2']
+        c1_offer: dict = kwargs['c1_offer']
+        c2_offer: dict = kwargs['c2_offer']
+
+        print_line = f'C{c1_idx+1}:{world.country_name(c1_idx)}  ({c1_offer["resource"]} x {int(c1_offer["quantity"])}) to C{c2_idx+1}:{world.country_name(c2_idx)}  ({c2_offer["resource"]} x {int(c2_offer["quantity"])})'
 
         return print_line
 
     def probability(self, world: WorldState, **kwargs) -> float:
-        world_state = world
+        table = world.table
 
-        c1_idx: int = kwargs['c1']
-        c1: Country = world_state.countries[c1_idx]
         c1_offer: dict = kwargs['c1_offer']
-        c1_offer_rsrc = c1_offer['resource']
         c1_offer_qty = int(c1_offer['quantity'])
-        r1 = c1.resources[c1_offer_rsrc]
+        r1: int = table.index[c1_offer['resource']]
 
-        r1_weight = -r1.weight if "'" in r1.name else r1.weight
+        r1_weight = -table.weight_list[r1] if table.waste_list[r1] \
+            else table.weight_list[r1]
         r1_est_val = (r1_weight + 0.1) * c1_offer_qty
 
-        c2_idx: int = kwargs['c2']
-        c2: Country = world_state.countries[c2_idx]
         c2_offer: dict = kwargs['c2_offer']
-        c2_offer_rsrc = c2_offer['resource']
         c2_offer_qty = int(c2_offer['quantity'])
-        r2 = c2.resources[c2_offer_rsrc]
+        r2: int = table.index[c2_offer['resource']]
 
-        r2_weight = -r2.weight if "'" in r2.name else r2.weight
+        r2_weight = -table.weight_list[r2] if table.waste_list[r2] \
+            else table.weight_list[r2]
         r2_est_val = (r2_weight + 0.1) * c2_offer_qty
 
         # perform a sigmoid calculation based on the change in state quality if Country 2 Accepts Trade
@@ -296,6 +322,25 @@ class Transfer(Action):
         sig = sigmoid(r1_est_val - r2_est_val)
         return sig
 
+    # Batched variants: evaluate many candidate propositions from Country c1 at once.
+    # c2, r1, q1, r2, q2 are equal length NumPy arrays (partner, resource indices and quantities)
+
+    def is_viable_batch(self, world: WorldState, c1_idx: int, c2, r1, q1, r2, q2) -> np.ndarray:
+        quantities: np.ndarray = world.as_array()
+        return (q1 > 0) & (q2 > 0) \
+            & (q1 <= quantities[c1_idx, r1]) \
+            & (q2 <= quantities[c2, r2])
+
+    def probability_batch(self, world: WorldState, r1, q1, r2, q2) -> np.ndarray:
+        table = world.table
+        weights: np.ndarray = np.where(
+            table.waste, -table.weights, table.weights)
+
+        r1_est_val = (weights[r1] + 0.1) * q1
+        r2_est_val = (weights[r2] + 0.1) * q2
+
+        return sigmoid(r1_est_val - r2_est_val)
+
 
 action_map: dict = {
     'Template - Alloy': AlloyTemplate(),
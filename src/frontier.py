@@ -4,21 +4,227 @@ Frontier Implementation -
 
 Models:
 
-UCS - Uniform Cost Search (Djikstra). Priority Queue
+UCS - Uniform Cost Search (Djikstra). Priority Queue (binary heap)
 DFS - Greedy Depth First Search. Priority Stack
+BUCKET - Bucketed Priority Queue, keyed on coarse (rounded) Expected Utility
+
+All frontiers pop the Node with the highest priority (Expected Utility) next.
 
 '''
 
+import heapq
+import math
+from abc import ABC, abstractmethod
+from itertools import count
+
 from node import Node
 
 
-class Frontier:
+class Frontier(ABC):
+
+    def __init__(self, root: Node = None):
+        if root:
+            self.push(root)
+
+    @abstractmethod
+    def push(self, node: Node):
+        pass
+
+    @abstractmethod
+    def pop(self) -> Node:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        return 0
+
+    def append(self, node: Node):
+        self.push(node)
+
+    def extend(self, nodes):
+        for node in nodes:
+            self.push(node)
+
+    # memory-bounded frontier (see spill) support:
+    # entries are (key, node) pairs, the entry with the lowest key is popped first
+
+    # remove and return the n entries which would be popped last
+    @abstractmethod
+    def spill(self, n: int) -> list:
+        return []
+
+    # put back entries returned by spill
+    @abstractmethod
+    def restore(self, entries: list):
+        pass
+
+    # key of the entry popped next (None if empty)
+    @abstractmethod
+    def peek(self):
+        return None
+
+
+'''
+Priority Stack:
+successors are expected to be pushed in ascending order (best last), so the best successor is expanded next
+'''
+
+
+class StackFrontier(Frontier):
+
+    def __init__(self, root: Node = None):
+        self.frontier: list = []
+        super().__init__(root)
 
-    def __init__(self, root: Node):
-        self.frontier = [root]
+    def push(self, node: Node):
+        self.frontier.append(node)
 
-    def append(self, nodes):
-        self.frontier.append(nodes)
+    def extend(self, nodes):
+        self.frontier.extend(nodes)
 
     def pop(self) -> Node:
         return self.frontier.pop()
+
+    def __len__(self) -> int:
+        return len(self.frontier)
+
+    # the bottom of the stack: all keys are equal, spilled entries are only needed once the stack is empty
+    def spill(self, n: int) -> list:
+        spilled: list = [(0, node) for node in self.frontier[:n]]
+        del self.frontier[:n]
+        return spilled
+
+    def restore(self, entries: list):
+        self.frontier[:0] = [node for _, node in entries]
+
+    def peek(self):
+        return 0 if self.frontier else None
+
+
+'''
+Priority Queue (binary heap):
+O(log F) push/pop, rather than re-sorting the whole frontier after every expansion.
+Ties on Expected Utility pop the most recently pushed Node first (matches a stable sort + pop from the back)
+'''
+
+
+class HeapFrontier(Frontier):
+
+    def __init__(self, root: Node = None):
+        self.heap: list = []
+        self.counter = count()
+        super().__init__(root)
+
+    def push(self, node: Node):
+        heapq.heappush(
+            self.heap, (-node.calc_expected_utility(), -next(self.counter), node))
+
+    def pop(self) -> Node:
+        return heapq.heappop(self.heap)[-1]
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    # a sorted list is still a heap, so the lowest priority entries are the tail
+    def spill(self, n: int) -> list:
+        self.heap.sort()
+        spilled: list = [(entry[:-1], entry[-1]) for entry in self.heap[len(self.heap)-n:]]
+        del self.heap[len(self.heap)-n:]
+        return spilled
+
+    def restore(self, entries: list):
+        for key, node in entries:
+            heapq.heappush(self.heap, (*key, node))
+
+    def peek(self):
+        return self.heap[0][:-1] if self.heap else None
+
+
+'''
+Bucketed Priority Queue:
+Nodes are grouped by coarse Expected Utility (EU rounded down to bucket_size).
+Pushing into an existing bucket is O(1), and only the bucket keys are kept in a heap.
+Within a bucket, Nodes are popped last in, first out.
+'''
+
+
+class BucketFrontier(Frontier):
+
+    bucket_size: float = 0.1
+
+    def __init__(self, root: Node = None):
+        self.buckets: dict = {}
+        self.keys: list = []  # max-heap of non-empty bucket keys (negated)
+        self.size: int = 0
+        super().__init__(root)
+
+    def push(self, node: Node):
+        key: int = math.floor(
+            node.calc_expected_utility() / BucketFrontier.bucket_size)
+
+        bucket: list = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = []
+            heapq.heappush(self.keys, -key)
+
+        bucket.append(node)
+        self.size += 1
+
+    def pop(self) -> Node:
+        key: int = -self.keys[0]
+        bucket: list = self.buckets[key]
+        node: Node = bucket.pop()
+
+        if not bucket:
+            del self.buckets[key]
+            heapq.heappop(self.keys)
+
+        self.size -= 1
+        return node
+
+    def __len__(self) -> int:
+        return self.size
+
+    # the oldest entries of the lowest buckets, keyed on the (negated) bucket key
+    def spill(self, n: int) -> list:
+        spilled: list = []
+        for key in sorted(self.buckets):
+            if len(spilled) >= n:
+                break
+
+            bucket: list = self.buckets[key]
+            count: int = min(n - len(spilled), len(bucket))
+            spilled.extend((-key, node) for node in bucket[:count])
+            del bucket[:count]
+
+            if not bucket:
+                del self.buckets[key]
+                self.keys.remove(-key)
+
+        heapq.heapify(self.keys)
+        self.size -= len(spilled)
+        return spilled
+
+    # spilled entries are older than any in their bucket, so they go back to the bottom of it
+    def restore(self, entries: list):
+        restored: dict = {}
+        for key, node in entries:
+            restored.setdefault(-key, []).append(node)
+
+        for key, nodes in restored.items():
+            bucket: list = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = []
+                heapq.heappush(self.keys, -key)
+            bucket[:0] = nodes
+            self.size += len(nodes)
+
+    def peek(self):
+        return self.keys[0] if self.keys else None
+
+
+frontier_map: dict = {
+    'DFS': StackFrontier,
+    'UCS': HeapFrontier,
+    'BUCKET': BucketFrontier,
+}
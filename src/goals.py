@@ -9,6 +9,7 @@ Using Logistic functions to compute
 '''
 
 from abc import ABC, abstractmethod
+import numpy as np
 from mathfunctions import sigmoid, inv_logit_function, inv_logit_decay_function
 from world import WorldState
 from resource import Resource
@@ -17,6 +18,10 @@ from resource import Resource
 '''
      A Goal class which defines a single method, "Progress" towards completing the goal.
 
+     progress_batch is the vectorized equivalent of progress:
+     rows is an (N x resources) array of a country's quantities in N candidate states,
+     and the N progress values are returned as an array.
+
 '''
 
 
@@ -26,38 +31,60 @@ class Goal(ABC):
     def progress(self, state: WorldState) -> float:
         return 0
 
+    @abstractmethod
+    def progress_batch(self, rows: np.ndarray, table) -> np.ndarray:
+        return np.zeros(len(rows))
+
 
-# country = state.countries[0]
-# r1: Resource = country.resources['R1']  # analog to population
+# Goals work on a country's row of quantities, indexed by the compiled resource index
+# ix = state.table.index
+# c = state.row(country_idx)
+# r1 = c[ix['R1']]  # analog to population
 # # penalize unspect quantity on hand.
-# r2: Resource = country.resources['R2']  # analog to metallic elements
-# r3: Resource = country.resources['R3']  # analog to timber
-# r21: Resource = country.resources['R21']  # analog to metallic alloys
-# r22: Resource = country.resources['R22']  # analog to electronics
-# r23: Resource = country.resources['R23']  # analog to housing
-# r21p: Resource = country.resources["R21'"]  # metallic waste
-# r22p: Resource = country.resources["R22'"]  # electronics waste
-# r23p: Resource = country.resources["R23'"]  # housing waste
+# r2 = c[ix['R2']]  # analog to metallic elements
+# r3 = c[ix['R3']]  # analog to timber
+# r21 = c[ix['R21']]  # analog to metallic alloys
+# r22 = c[ix['R22']]  # analog to electronics
+# r23 = c[ix['R23']]  # analog to housing
+# r21p = c[ix["R21'"]]  # metallic waste
+# r22p = c[ix["R22'"]]  # electronics waste
+# r23p = c[ix["R23'"]]  # housing waste
 
 class EndHomelessness(Goal):
 
     # base calculation on a ratio of percentage of unhoused people, presuming 1:1 population to housing unit
     def progress(self, state: WorldState, country_idx: int = 0) -> float:
-        country = state.countries[country_idx]
-        r1: Resource = country.resources['R1']  # analog to population
-        r23: Resource = country.resources['R23']  # analog to housing
+        ix: dict = state.table.index
+        w: list = state.table.weight_list
+        c: list = state.row(country_idx)
+        r1: int = c[ix['R1']]  # analog to population
+        r23: int = c[ix['R23']]  # analog to housing
 
-        if(r23.quantity == 0):
+        if(r23 == 0):
             return 0
 
-        housing_ratio = r23.quantity/r1.quantity
+        housing_ratio = r23/r1
 
         # Homelessenss quality following a Logistic Curve approximation mapped to domain 0-1
         # This w=0.8, and population starts at 100, with inverse logit creates range 0-80
-        return r23.weight * r1.quantity * \
+        return w[ix['R23']] * r1 * \
             (1 if housing_ratio >= 1 else
              inv_logit_function(housing_ratio))
 
+    def progress_batch(self, rows: np.ndarray, table) -> np.ndarray:
+        ix: dict = table.index
+        w: list = table.weight_list
+        r1 = rows[:, ix['R1']]
+        r23 = rows[:, ix['R23']]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            housing_ratio = r23/r1
+            progress = w[ix['R23']] * r1 * \
+                np.where(housing_ratio >= 1, 1.,
+                         inv_logit_function(housing_ratio))
+
+        return np.where(r23 == 0, 0., progress)
+
 
 class BalancedElectronics(Goal):
     # base calculation on number of electronics per house-hold. (NOT population)
@@ -65,19 +92,21 @@ class BalancedElectronics(Goal):
     # This means exceeding this ratio does not improve quality
 
     def progress(self,  state: WorldState, country_idx: int = 0) -> float:
-        country = state.countries[0]
+        ix: dict = state.table.index
+        w: list = state.table.weight_list
+        c: list = state.row(country_idx)
 
-        r1: Resource = country.resources['R1']  # analog to population
-        r22: Resource = country.resources['R22']  # analog to electronics
-        r23: Resource = country.resources['R23']  # analog to housing
+        r1: int = c[ix['R1']]  # analog to population
+        r22: int = c[ix['R22']]  # analog to electronics
+        r23: int = c[ix['R23']]  # analog to housing
 
-        if(r23.quantity == 0):
+        if(r23 == 0):
             return 0
-        if(r22.quantity == 0):
+        if(r22 == 0):
             return 0
 
-        housing_ratio = r23.quantity/r1.quantity
-        electronics_ratio = r22.quantity/r23.quantity
+        housing_ratio = r23/r1
+        electronics_ratio = r22/r23
         max_cap = 5
 
         # Electronics quality following an Decaying inverse Logit Function:
@@ -89,10 +118,27 @@ class BalancedElectronics(Goal):
         #
         # also dependent on housing ratio, such that electronics don't have as much impact until homelessness has mostly ended
         #
-        return r22.weight * r22.quantity * housing_ratio * \
+        return w[ix['R22']] * r22 * housing_ratio * \
             (0 if electronics_ratio >= max_cap else
              inv_logit_decay_function(electronics_ratio, max_cap))
 
+    def progress_batch(self, rows: np.ndarray, table) -> np.ndarray:
+        ix: dict = table.index
+        w: list = table.weight_list
+        r1 = rows[:, ix['R1']]
+        r22 = rows[:, ix['R22']]
+        r23 = rows[:, ix['R23']]
+        max_cap = 5
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            housing_ratio = r23/r1
+            electronics_ratio = r22/r23
+            progress = w[ix['R22']] * r22 * housing_ratio * \
+                np.where(electronics_ratio >= max_cap, 0.,
+                         inv_logit_decay_function(electronics_ratio, max_cap))
+
+        return np.where((r23 == 0) | (r22 == 0), 0., progress)
+
 
 class MinimalWaste(Goal):
     # base calculation on number of electronics per house-hold. (NOT population)
@@ -100,15 +146,17 @@ class MinimalWaste(Goal):
     # This means exceeding this ratio does not improve quality
 
     def progress(self,  state: WorldState, country_idx: int = 0) -> float:
-        country = state.countries[country_idx]
+        ix: dict = state.table.index
+        w: list = state.table.weight_list
+        c: list = state.row(country_idx)
 
-        r21: Resource = country.resources['R21']  # analog to metallic alloys
-        r22: Resource = country.resources['R22']  # analog to electronics
-        r23: Resource = country.resources['R23']  # analog to housing
+        r21: int = c[ix['R21']]  # analog to metallic alloys
+        r22: int = c[ix['R22']]  # analog to electronics
+        r23: int = c[ix['R23']]  # analog to housing
 
-        r21p: Resource = country.resources["R21'"]  # metallic waste
-        r22p: Resource = country.resources["R22'"]  # electronics waste
-        r23p: Resource = country.resources["R23'"]  # housing waste
+        r21p: int = c[ix["R21'"]]  # metallic waste
+        r22p: int = c[ix["R22'"]]  # electronics waste
+        r23p: int = c[ix["R23'"]]  # housing waste
 
         waste = 0
 
@@ -117,55 +165,88 @@ class MinimalWaste(Goal):
         # eg: If I have 100 Housing Units, and 100 Housing Waste, thats considered acceptable,
         # however, if I have 100 Housing Units, and 200 Housing waste, that far exceeds the expectation, and causes a rectifying term to kick in
 
-        housing_waste_surplus = r23p.quantity - r23.quantity
+        housing_waste_surplus = r23p - r23
         if(housing_waste_surplus > 0):
-            housing_waste_ratio = r23p.quantity/(r23p.quantity + r23.quantity)
+            housing_waste_ratio = r23p/(r23p + r23)
 
-            waste += 0.1 * housing_waste_surplus * r23p.weight * \
+            waste += 0.1 * housing_waste_surplus * w[ix["R23'"]] * \
                 (1 if housing_waste_ratio == 1 else
                  inv_logit_function(housing_waste_ratio))
 
         # Apply similar thining to Electronics Waste
-        elec_waste_surplus = r22p.quantity - r22.quantity
+        elec_waste_surplus = r22p - r22
         if(elec_waste_surplus > 0):
-            elec_waste_ratio = r22p.quantity / (r22.quantity + r22p.quantity)
+            elec_waste_ratio = r22p / (r22 + r22p)
 
-            waste += 0.1 * elec_waste_surplus * r22p.weight * \
+            waste += 0.1 * elec_waste_surplus * w[ix["R22'"]] * \
                 (1 if elec_waste_ratio == 1 else
                  inv_logit_function(elec_waste_ratio))
 
         # Apply similar thinking to Alloy waste, however, we cap out with a ratio of  waste surplus to products produced
-        alloy_waste_surplus = r21p.quantity - r21.quantity
+        alloy_waste_surplus = r21p - r21
         if(alloy_waste_surplus > 0):
-            alloy_waste_ratio = r21p.quantity/(r21.quantity + r21p.quantity)
+            alloy_waste_ratio = r21p/(r21 + r21p)
 
-            waste += 0.1 * alloy_waste_surplus * r21p.weight * \
+            waste += 0.1 * alloy_waste_surplus * w[ix["R21'"]] * \
                 (1 if alloy_waste_ratio == 1 else
                  inv_logit_function(alloy_waste_ratio))
 
         # waste is detrimental to quality calculation, so negate
         return -waste
 
+    def progress_batch(self, rows: np.ndarray, table) -> np.ndarray:
+        ix: dict = table.index
+        w: list = table.weight_list
+        waste = np.zeros(len(rows))
+
+        # same housing, electronics, alloy order as the scalar sum
+        for product, product_waste in (('R23', "R23'"), ('R22', "R22'"), ('R21', "R21'")):
+            r = rows[:, ix[product]]
+            rp = rows[:, ix[product_waste]]
+
+            surplus = rp - r
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = rp/(rp + r)
+                term = 0.1 * surplus * w[ix[product_waste]] * \
+                    np.where(ratio == 1, 1., inv_logit_function(ratio))
+
+            waste += np.where(surplus > 0, term, 0.)
+
+        return -waste
+
 
 class ResourcesOnHand(Goal):
 
     def progress(self,  state: WorldState, country_idx: int = 0) -> float:
-        country = state.countries[country_idx]
+        ix: dict = state.table.index
+        w: list = state.table.weight_list
+        c: list = state.row(country_idx)
 
-        r1: Resource = country.resources['R1']  # analog to population
-        r2: Resource = country.resources['R2']  # analog to metallic alloys
-        r3: Resource = country.resources['R3']  # analog to metallic alloys
-        r21: Resource = country.resources['R21']  # analog to metallic alloys
-        r22: Resource = country.resources['R22']  # analog to electronics
-        r23: Resource = country.resources['R23']  # analog to housing
+        r1: int = c[ix['R1']]  # analog to population
+        r2: int = c[ix['R2']]  # analog to metallic alloys
+        r3: int = c[ix['R3']]  # analog to metallic alloys
+        r21: int = c[ix['R21']]  # analog to metallic alloys
+        r22: int = c[ix['R22']]  # analog to electronics
+        r23: int = c[ix['R23']]  # analog to housing
 
         # simple weighted sum of resources per capita
-        return (r21.quantity * r21.weight +
-                r22.quantity * r22.weight +
-                r2.quantity * (r2.weight + 0.1) +
-                r3.quantity * (r3.weight + 0.1) +
-                r23.quantity * r23.weight) /\
-            r1.quantity
+        return (r21 * w[ix['R21']] +
+                r22 * w[ix['R22']] +
+                r2 * (w[ix['R2']] + 0.1) +
+                r3 * (w[ix['R3']] + 0.1) +
+                r23 * w[ix['R23']]) /\
+            r1
+
+    def progress_batch(self, rows: np.ndarray, table) -> np.ndarray:
+        ix: dict = table.index
+        w: list = table.weight_list
+
+        return (rows[:, ix['R21']] * w[ix['R21']] +
+                rows[:, ix['R22']] * w[ix['R22']] +
+                rows[:, ix['R2']] * (w[ix['R2']] + 0.1) +
+                rows[:, ix['R3']] * (w[ix['R3']] + 0.1) +
+                rows[:, ix['R23']] * w[ix['R23']]) /\
+            rows[:, ix['R1']]
 
 
 goal_map: dict = {
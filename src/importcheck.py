@@ -0,0 +1,84 @@
+'''
+
+Import Check -
+
+Measures the cold import time of the search core in a fresh interpreter (python -X importtime),
+and fails if importing it pulls in any of the plotting/data libraries a headless search never uses.
+
+Run from the repo root:
+    python src/importcheck.py
+    python src/importcheck.py --output import_times.jsonl   (appends a record per run, to track import time over time)
+
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+core_modules: list = ['node', 'events', 'goals', 'quality', 'world']
+heavy_modules: list = ['matplotlib', 'pandas', 'PIL']
+
+src_dir: str = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module: str) -> dict:
+    code: str = f'import {module}, json, sys; ' \
+        f'print(json.dumps([m for m in {heavy_modules!r} if m in sys.modules]))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=src_dir, capture_output=True, text=True, check=True)
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    # dependencies are printed (indented) before the package importing them
+    imports: list = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name[1:].rstrip(), int(cumulative)))
+
+    end: int = next(i for i, (name, _) in enumerate(imports) if name == module)
+    start: int = end
+    while start > 0 and imports[start - 1][0].startswith(' '):
+        start -= 1
+
+    # direct dependencies of the module, by cumulative time
+    direct: list = [(name.strip(), us) for name, us in imports[start:end]
+                    if not name.startswith('    ')]
+
+    return {
+        'module': module,
+        'seconds': imports[end][1] / 1e6,
+        'heavy': json.loads(result.stdout.strip().splitlines()[-1]),
+        'slowest': [name for name, _ in sorted(direct, key=lambda i: -i[1])][:5],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure import time of the search core')
+    parser.add_argument('--modules', '-m', nargs='+', default=core_modules,
+                        help='modules to import (default: the search core)')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='append the results as a json line to this file')
+    args = parser.parse_args()
+
+    results: list = [measure(module) for module in args.modules]
+
+    failed: bool = False
+    for r in results:
+        print(f"{r['module']:<10} {round(1000 * r['seconds'], 1):>8} ms \t slowest: {', '.join(r['slowest'])}")
+        if r['heavy']:
+            failed = True
+            print(f"  -- imports {', '.join(r['heavy'])}")
+
+    if args.output:
+        with open(args.output, 'a') as outfile:
+            outfile.write(json.dumps({'time': time.time(),
+                                      'python': sys.version.split()[0],
+                                      'results': results}) + '\n')
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,214 @@
+'''
+
+Background Jobs -
+
+Runs searches for the Flask service (see FlaskApp) outside of the HTTP request:
+a job is submitted, gets an id right away, and is run by a bounded pool of worker processes.
+The pool's processes are long lived, so the scenario files they have loaded (world.load_scenario) stay warm between jobs.
+
+Job state (status, progress, start/end times) is kept in a dict shared with the workers (multiprocessing Manager):
+the worker updates the number of rollouts done (JobProgress.checked, at most every interval seconds),
+and cancelling a running job sets its Event, which the search checks between rollouts (see traverse.run_rollouts).
+Jobs still queued are cancelled without running.
+
+status: queued -> running -> done | failed | cancelled (cancelling: asked to stop, not stopped yet)
+Finished jobs are kept (with their results) up to max_jobs, the oldest ones are dropped first.
+
+'''
+
+import time
+import uuid
+import threading
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+
+
+class JobProgress:
+
+    def __init__(self, state, job_id: str, interval: float = 0.5):
+        self.state = state  # shared dict: job id -> job state
+        self.job_id: str = job_id
+        self.interval: float = interval
+        self.published: float = 0.
+        self._checked: int = 0
+
+    # set by the search loop, like ProgressReporter.checked
+    @property
+    def checked(self) -> int:
+        return self._checked
+
+    @checked.setter
+    def checked(self, checked: int):
+        self._checked = checked
+        now: float = time.time()
+        if now - self.published >= self.interval:
+            self.published = now
+            update(self.state, self.job_id, checked=checked)
+
+
+# job state values are plain dicts: replaced as a whole so the Manager sees the update
+def update(state, job_id: str, **values):
+    job: dict = state.get(job_id)
+    if job is not None:
+        state[job_id] = {**job, **values}
+
+
+# runs in a worker process: fn(params, progress, cancel) returns the job's (json) result
+def run_job(fn, job_id: str, params: dict, state, cancel) -> dict:
+    if cancel.is_set():
+        update(state, job_id, status='cancelled', ended=time.time())
+        return None
+
+    update(state, job_id, status='running', started=time.time())
+    progress: JobProgress = JobProgress(state, job_id)
+    try:
+        result: dict = fn(params, progress, cancel)
+    except Exception:
+        update(state, job_id, status='failed', error=traceback.format_exc(limit=5), ended=time.time())
+        raise
+
+    update(state, job_id, status='cancelled' if cancel.is_set() else 'done', checked=progress.checked,
+           ended=time.time())
+    return result
+
+
+def done_callback(future: Future, params: dict, callback, ready: threading.Event, stored: dict, job_id: str):
+    try:
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            stored[job_id] = callback(params, future.result())
+    finally:
+        ready.set()
+
+
+class JobPool:
+
+    def __init__(self, fn, workers: int = 2, max_jobs: int = 100):
+        self.fn = fn  # fn(params, progress, cancel) -> result, picklable (a module level function)
+        self.workers: int = workers
+        self.max_jobs: int = max_jobs
+
+        # started on the first job
+        self.manager = None
+        self.executor: ProcessPoolExecutor = None
+        self.state = None
+
+        # job id -> (future, cancel event, ready event), oldest first.
+        # ready is set once the job's callback is over: until then, a finished job is still reported as running
+        self.jobs: OrderedDict = OrderedDict()
+        self.stored: dict = {}  # job id -> what its callback returned (ex: where the result was stored)
+        self.lock: threading.Lock = threading.Lock()
+
+    def start(self):
+        self.manager = multiprocessing.Manager()
+        self.state = self.manager.dict()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    # callback(params, result) is called (in the parent, from the executor's thread) once the job is done,
+    # what it returns is reported as the job's 'stored'
+    def submit(self, params: dict, total: int = None, callback=None) -> str:
+        with self.lock:
+            if self.executor is None:
+                self.start()
+
+            job_id: str = uuid.uuid4().hex
+            self.state[job_id] = {'status': 'queued', 'checked': 0, 'total': total, 'params': params,
+                                  'submitted': time.time(), 'started': None, 'ended': None}
+            cancel = self.manager.Event()
+            ready: threading.Event = threading.Event()
+            future: Future = self.executor.submit(run_job, self.fn, job_id, params, self.state, cancel)
+            self.jobs[job_id] = (future, cancel, ready)
+            self.drop_finished()
+
+        if callback:
+            future.add_done_callback(lambda f: done_callback(f, params, callback, ready, self.stored, job_id))
+        else:
+            ready.set()
+        return job_id
+
+    # a job whose result is already known (ex: cached), done as soon as it is submitted
+    def completed(self, params: dict, result: dict, total: int = None, stored=None) -> str:
+        with self.lock:
+            if self.executor is None:
+                self.start()
+
+            job_id: str = uuid.uuid4().hex
+            now: float = time.time()
+            self.state[job_id] = {'status': 'done', 'checked': total, 'total': total, 'params': params,
+                                  'submitted': now, 'started': now, 'ended': now, 'cached': True}
+            future: Future = Future()
+            future.set_result(result)
+            ready: threading.Event = threading.Event()
+            ready.set()
+            self.jobs[job_id] = (future, self.manager.Event(), ready)
+            self.stored[job_id] = stored
+            self.drop_finished()
+
+        return job_id
+
+    # job state and, once done, its result. None for an unknown job id
+    def get(self, job_id: str) -> dict:
+        with self.lock:
+            entry: tuple = self.jobs.get(job_id)
+        if entry is None:
+            return None
+
+        future, _, ready = entry
+        job: dict = {'id': job_id, **self.state[job_id]}
+        if future.cancelled():
+            job['status'] = 'cancelled'
+        elif future.done() and not ready.is_set():
+            job['status'] = 'running'
+        elif future.done():
+            error = future.exception()
+            if error is not None:
+                job['status'] = 'failed'
+                job.setdefault('error', repr(error))
+            else:
+                # a job asked to stop after its search was over still has its results
+                result: dict = future.result()
+                job['status'] = 'cancelled' if result is None else 'done'
+                if result is not None:
+                    job['result'] = result
+                    job['stored'] = self.stored.get(job_id)
+
+        now: float = time.time()
+        if job['started']:
+            job['elapsed'] = (job['ended'] or now) - job['started']
+        return job
+
+    # cancels a queued job, or asks a running job to stop. None for an unknown job id
+    def cancel(self, job_id: str) -> dict:
+        with self.lock:
+            entry: tuple = self.jobs.get(job_id)
+        if entry is None:
+            return None
+
+        future, cancel, _ = entry
+        if future.done():
+            return self.get(job_id)
+
+        cancel.set()
+        if future.cancel():
+            update(self.state, job_id, status='cancelled', ended=time.time())
+        else:
+            # already handed to a worker: it stops at its next check
+            update(self.state, job_id, status='cancelling')
+        return self.get(job_id)
+
+    def drop_finished(self):
+        finished: list = [job_id for job_id, (future, _, ready) in self.jobs.items()
+                          if future.done() and ready.is_set()]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+            del self.state[job_id]
+            self.stored.pop(job_id, None)
+
+    def shutdown(self):
+        if self.executor is not None:
+            for future, cancel, _ in self.jobs.values():
+                cancel.set()
+            self.executor.shutdown(cancel_futures=True)
+            self.manager.shutdown()
+            self.executor = None
@@ -13,17 +13,15 @@ author: Richard White
 # %%
 import os
 import argparse
-import random
-import copy
-import math
 import pickle
 
-import policy
 from node import Node
 import visualize
 import mathfunctions
 
-from traverse import traverse_node
+from traverse import run_rollouts
+from metrics import Metrics
+from profiling import Profiler, profile_modes
 # %%
 parser = argparse.ArgumentParser(
     description='CLI args to fine-tuning/running variants on the World Trade/Game Search')
@@ -70,72 +68,107 @@ parser.add_argument("--max_solutions", "--c", "-c", default=25,
                     type=int, help="set a fundamental cap on how many satisfiable schedules searched. \
                         NOTE: node/state must not only be viable/non-zero probability, but must satisfy schedule needs")
 
-
-# INPUT SANITATION:
-
-args = parser.parse_args()
-print(args)
-
-# heuristic: str = args.heuristic
-depth: int = args.depth
-soln_size: int = args.soln_set_size
-initial_state_file: int = args.initial_state_file
-gamma: float = args.gamma
-threshold: float = args.threshold
-sched_threshold: float = args.schedule_threshold
-k: float = args.k
-beam_width: int = args.beam_width
-max_checks: int = args.max_solutions
-
-
-output_dir = f'schedules/schedule-mstochastic-d{depth}-i{initial_state_file}-g{gamma}-k{k}-b{beam_width}-c{max_checks}-t{threshold}'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-
-Node.gamma = gamma
-Node.threshold = threshold
-Node.sched_threshold = sched_threshold
-mathfunctions.k = k
-
-
-#
-# initialize root node
-#
-Node.init_state_idx = initial_state_file
-
-
-# Collections of Nodes which represent viable solutions (depth achieved)
-#  solutions contain the World State, history of transactions,
-# and Utility function/measure of State quality at given step.
-top_solutions = []
-soln_count: int = 0
-
-min_eu = -1.
-
-# instantiate a root node
-root: Node = Node()
-
-for i in range(max_checks):
-    print(f"Iter: {i}")
-
-    policy.reset_policy_checks()
-    soln: Node = traverse_node(copy.deepcopy(root), depth)
-
-    # don't bother putting in top solutions if cannot content with the min expected utility already in the top_solutions
-    if len(top_solutions) < soln_size or soln.calc_expected_utility() >= min_eu:
-
-        top_solutions.append(soln)  # add solution to "top solutions"
-        top_solutions.sort(key=lambda n: n.calc_expected_utility(),
-                           reverse=True)  # sort top solutions
-        while len(top_solutions) > soln_size:  # only keep the X best solutions
-            removed_soln = top_solutions.pop()
-        min_eu = min([soln.calc_expected_utility() for soln in top_solutions])
-
-
-# Store Soltions in a 'pickled' list to learn from
-soln_pickle = "soln.pickle"
-with open(soln_pickle, 'wb') as outfile:
-    pickle.dump(top_solutions, outfile)
-
-visualize.print_schedules(output_dir, top_solutions, max_checks)
+parser.add_argument("--compact", "-compact", action='store_true',
+                    help="compact mode: store the world as a single (countries x resources) int matrix, \
+                        making state copies a single small array copy")
+
+parser.add_argument("--workers", "-w", default=1,
+                    type=int, help="number of worker processes to spread the rollouts over (1: run serially)")
+
+parser.add_argument("--seed", default=None,
+                    type=int, help="base random seed. Each rollout gets its own seed derived from it, \
+                        so runs are reproducible whatever the number of workers")
+
+parser.add_argument("--sampler", default='batched', choices=['batched', 'full'],
+                    type=str, help="successor sampler of the rollouts: batched (score Transfer candidates as arrays, \
+                        only building the sampled Node) or full (reference: build every successor Node)")
+
+parser.add_argument("--unique", "-u", action='store_true',
+                    help="drop duplicate schedules (same actions and arguments) from the top solutions")
+
+parser.add_argument("--metrics", action='store_true',
+                    help="collect search telemetry (throughput, branching factor and prunes per depth, timers), \
+                        written to metrics.json in the output directory")
+
+parser.add_argument("--reference", action='store_true',
+                    help="reference implementation: full expansion sampler, building a Node for every Transfer candidate, \
+                        used to check the optimized rollouts return the same schedules")
+
+parser.add_argument("--profile", default=None, choices=profile_modes,
+                    type=str, help="profile the rollouts, written to the output directory. \
+                        cpu: cProfile stats and collapsed stacks (flamegraph), mem: top tracemalloc allocation sites. \
+                        only the main process is profiled")
+
+# worker processes may re-import this script (spawn start method), so only run the search as __main__
+if __name__ == '__main__':
+    # INPUT SANITATION:
+
+    args = parser.parse_args()
+    print(args)
+
+    # heuristic: str = args.heuristic
+    depth: int = args.depth
+    soln_size: int = args.soln_set_size
+    initial_state_file: int = args.initial_state_file
+    gamma: float = args.gamma
+    threshold: float = args.threshold
+    sched_threshold: float = args.schedule_threshold
+    k: float = args.k
+    beam_width: int = args.beam_width
+    max_checks: int = args.max_solutions
+    compact: bool = args.compact
+    workers: int = args.workers
+    seed: int = args.seed
+    sampler: str = 'full' if args.reference else args.sampler
+    unique: bool = args.unique
+
+    output_dir = f'schedules/schedule-mstochastic-d{depth}-i{initial_state_file}-g{gamma}-k{k}-b{beam_width}-c{max_checks}-t{threshold}'
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    Node.gamma = gamma
+    Node.threshold = threshold
+    Node.sched_threshold = sched_threshold
+    Node.compact = compact
+    Node.batch_transfers = not args.reference
+    mathfunctions.k = k
+
+    #
+    # initialize root node
+    #
+    Node.init_state_idx = initial_state_file
+
+    # Collections of Nodes which represent viable solutions (depth achieved)
+    #  solutions contain the World State, history of transactions,
+    # and Utility function/measure of State quality at given step.
+    root: Node = Node()  # instantiate a root node
+
+    if args.metrics:
+        Node.metrics = Metrics(Node.id)
+
+    profiler: Profiler = Profiler(args.profile, output_dir) if args.profile else None
+    if profiler:
+        profiler.start()
+
+    top_solutions: list = run_rollouts(root, depth, max_checks, soln_size,
+                                       workers=workers, seed=seed, sampler=sampler,
+                                       unique=unique)
+
+    profile_files: list = profiler.stop() if profiler else []
+
+    # written before rendering the results, so the timings only cover the rollouts
+    metrics_file: str = Node.metrics.write(output_dir, Node.id, sampler=sampler, workers=workers,
+                                           rollouts=max_checks) if Node.metrics else None
+
+    # Store Soltions in a 'pickled' list to learn from
+    soln_pickle = "soln.pickle"
+    with open(soln_pickle, 'wb') as outfile:
+        pickle.dump(top_solutions, outfile)
+
+    visualize.print_schedules(output_dir, top_solutions, max_checks)
+
+    if metrics_file:
+        print(f'Metrics: {metrics_file}')
+
+    for profile_file in profile_files:
+        print(f'Profile: {profile_file}')
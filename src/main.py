@@ -16,9 +16,16 @@ import argparse
 import pickle
 
 from node import Node
+from frontier import Frontier, frontier_map, BucketFrontier
+from transposition import TranspositionTable
+from search import search, parallel_search, iterative_deepening, branch_and_bound, beam_search
+from bound import SkipReport
+from spill import SpillFrontier
+from progress import ProgressReporter, progress_enabled
+from metrics import Metrics
+from profiling import Profiler, profile_modes
 import visualize
 import mathfunctions
-import policy
 
 
 # %%
@@ -28,7 +35,14 @@ parser = argparse.ArgumentParser(
 parser.add_argument('--model', '--m', '-m',  default='DFS',
                     type=str, help='Choosing Search Model- \
                         DFS (greedy-local-depth-first-search \
-                        UCS (uniform-cost search (Djikstra)')
+                        UCS (uniform-cost search (Djikstra) \
+                        BUCKET (uniform-cost search over a bucketed priority queue of coarse EU keys) \
+                        IDDFS (iterative deepening depth-first-search, O(depth) memory) \
+                        ASTAR (branch and bound: best first on EU plus an admissible bound on the EU still reachable) \
+                        BEAM (layer-synchronous beam search: keeps the beam_width best nodes of each depth)')
+
+parser.add_argument("--bucket_size", "--bs", "-bs", default=0.1,
+                    type=float, help='Expected Utility resolution of the BUCKET model priority queue')
 
 # not applicable at moment
 # parser.add_argument('--heuristic', '--htype', '-htype', default='',
@@ -75,130 +89,173 @@ parser.add_argument("--max_solutions", "--c", "-c", default=10000,
 
 parser.add_argument("--max_nodes", "--n", "-n", default=1000000,
                     type=int, help="set a fundamental cap on States to explore. \
-                        NOTE: node/state need only be viable")
-
-
-# INPUT SANITATION:
-
-args = parser.parse_args()
-print(args)
-
-model: str = args.model
-# heuristic: str = args.heuristic
-depth: int = args.depth
-soln_size: int = args.soln_set_size
-initial_state_file: int = args.initial_state_file
-gamma: float = args.gamma
-threshold: float = args.threshold
-sched_threshold: float = args.schedule_threshold
-k: float = args.k
-beam_width: int = args.beam_width
-max_checks: int = args.max_solutions
-max_nodes: int = args.max_nodes
-
-
-output_dir = f'schedules/schedule-m{model}-d{depth}-i{initial_state_file}-g{gamma}-k{k}-b{beam_width}-c{max_checks}-t{threshold}'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-
-Node.gamma = gamma
-Node.threshold = threshold
-Node.sched_threshold = sched_threshold
-mathfunctions.k = k
-
-# supported models:
-# UCS - Uniform Cost Search - uses Priority Queue/ Dijkstras search expanding/checking nodes with top cost regardless of depth
-# DFS - Depth First Search - uses Priority Stack/expanding towards best quality function
-if(model != "DFS"):
-    model = "UCS"
-
-
-#
-# initialize root node
-#
-Node.init_state_idx = initial_state_file
-root: Node = Node()
-
-frontier = [root]  # search frontier
-
-# Collections of Nodes which represent viable solutions (depth achieved)
-#  solutions contain the World State, history of transactions,
-# and Utility function/measure of State quality at given step.
-top_solutions = []
-soln_count: int = 0
-
-min_eu = -1.
-
-# Continue Search as long as there exists searchable nodes/expansion where depth has not been achieved
-while(len(frontier) > 0):
-
-    # force out of search if max_checks are achieved. Could be a range of reasons
-    # search needs to stopped prematurely after checks
-    if soln_count >= max_checks or Node.id >= max_nodes:
-        break
-
-    # grab the last node in the list (treated as priority stack or queue)
-    node = frontier.pop()
-
-    # CLI/'TOP' like command, that refreshes/clears screen and reposts top solutions every 100 solns checked.
-    soln_count += 1
-    if(soln_count % 1000 == 0):
-        visualize.print_top_solutions(top_solutions, soln_count)
-
-    # keep a small list of top solutions, based on quality order
-    soln = node  # copy.deepcopy(node)
-
-    # don't bother putting in top solutions if cannot content with the min expected utility already in the top_solutions
-    if len(top_solutions) < soln_size or soln.calc_expected_utility() >= min_eu:
-
-        top_solutions.append(soln)  # add solution to "top solutions"
-        top_solutions.sort(key=lambda n: n.calc_expected_utility(),
-                           reverse=True)  # sort top solutions
-        while len(top_solutions) > soln_size:  # only keep the X best solutions
-            removed_soln = top_solutions.pop()
-        min_eu = min([soln.calc_expected_utility() for soln in top_solutions])
-
-    # check if bounded depth has been reached - Recursive Base Case:
-    # Avoid generating successors beyond this point
-    if node.is_solution(depth):
-        continue
-
-    policy_present = policy.meets_policy(node.state)
-    if policy_present:
-        children = [policy.apply_policy(node, policy_present, depth)]
-
-    # if current depth is not a solution, then expand in all ways
-    # Avoid pursuing successors which fail to pass schedule
-    # additional params to override and force a branch to be terminal/a leaf node
-    # this indicates a terminal/invalid path: the leaf is not checked as a solution
-    # filter out forced_leaf nodes
+                        NOTE: node/state need only be viable. \
+                        Counts the Nodes built (Node.id, 'Total Nodes generated'): Transfers below threshold/schedule_threshold \
+                        are only built with --reference, so the same cap allows a deeper search without it")
+
+parser.add_argument("--transposition_size", "--tt", "-tt", default=0,
+                    type=int, help="size of the (LRU) transposition table used to merge equivalent world states \
+                        reached by different action orders. 0 disables the table")
+
+parser.add_argument("--compact", "-compact", action='store_true',
+                    help="compact mode: store the world as a single (countries x resources) int matrix, \
+                        making state copies a single small array copy")
+
+parser.add_argument("--workers", "-w", default=1,
+                    type=int, help="number of worker processes to search the root's subtrees with (1: serial search)")
+
+parser.add_argument("--split_depth", "--sd", "-sd", default=1,
+                    type=int, help="with --workers: depth of the tree expanded by the parent process, \
+                        each node at this depth is the root of a subtree searched by a worker")
+
+parser.add_argument("--unique", "-u", action='store_true',
+                    help="drop duplicate schedules (same actions and arguments) from the top solutions")
+
+parser.add_argument("--progress", default='auto', choices=['auto', 'on', 'off'],
+                    type=str, help="live progress report (redrawn in place every --progress_interval seconds). \
+                        auto: only when the output is a terminal")
+
+parser.add_argument("--progress_interval", default=1.0,
+                    type=float, help="seconds between progress report redraws")
+
+parser.add_argument("--metrics", action='store_true',
+                    help="collect search telemetry (throughput, branching factor and prunes per depth, timers), \
+                        written to metrics.json in the output directory")
+
+parser.add_argument("--reference", action='store_true',
+                    help="reference implementation: build a Node for every Transfer candidate (no batched transfers), \
+                        used to check the optimized search returns the same schedules")
+
+parser.add_argument("--max_memory", "--mm", "-mm", default=0,
+                    type=int, help="memory budget in MB (0: unbounded). once exceeded, the lowest priority frontier \
+                        entries are spilled to disk, and loaded back when they are next in line")
+
+parser.add_argument("--profile", default=None, choices=profile_modes,
+                    type=str, help="profile the search, written to the output directory. \
+                        cpu: cProfile stats and collapsed stacks (flamegraph), mem: top tracemalloc allocation sites. \
+                        only the main process is profiled")
+
+# worker processes may re-import this script (spawn start method), so only run the search as __main__
+if __name__ == '__main__':
+    # INPUT SANITATION:
+
+    args = parser.parse_args()
+    print(args)
+
+    model: str = args.model
+    # heuristic: str = args.heuristic
+    depth: int = args.depth
+    soln_size: int = args.soln_set_size
+    initial_state_file: int = args.initial_state_file
+    gamma: float = args.gamma
+    threshold: float = args.threshold
+    sched_threshold: float = args.schedule_threshold
+    k: float = args.k
+    beam_width: int = args.beam_width
+    max_checks: int = args.max_solutions
+    compact: bool = args.compact
+    max_nodes: int = args.max_nodes
+    BucketFrontier.bucket_size = args.bucket_size
+    transposition_size: int = args.transposition_size
+    workers: int = args.workers
+    split_depth: int = args.split_depth
+    unique: bool = args.unique
+    max_memory: int = args.max_memory * 2**20  # bytes
+    progress: ProgressReporter = ProgressReporter(args.progress_interval) \
+        if progress_enabled(args.progress) else None
+
+    output_dir = f'schedules/schedule-m{model}-d{depth}-i{initial_state_file}-g{gamma}-k{k}-b{beam_width}-c{max_checks}-t{threshold}'
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    Node.gamma = gamma
+    Node.threshold = threshold
+    Node.sched_threshold = sched_threshold
+    Node.compact = compact
+    Node.batch_transfers = not args.reference
+    mathfunctions.k = k
+
+    # supported models:
+    # UCS - Uniform Cost Search - uses Priority Queue/ Dijkstras search expanding/checking nodes with top cost regardless of depth
+    # DFS - Depth First Search - uses Priority Stack/expanding towards best quality function
+    # BUCKET - Uniform Cost Search using a bucketed Priority Queue (coarse EU keys)
+    # IDDFS - Iterative Deepening Depth First Search - depth limited DFS passes, successors generated lazily
+    # ASTAR - Branch and Bound - best first on f = EU + an upper bound on the EU still reachable (Node.calc_a_star),
+    #   cutting subtrees which can't reach the top solutions
+    # BEAM - Beam Search - one depth at a time, keeping the beam_width best nodes (on EU) of each depth
+    #   (IDDFS/ASTAR/BEAM run serially, without transposition table or memory budget)
+    model = model.upper()
+    if(model not in frontier_map and model not in ("IDDFS", "ASTAR", "BEAM")):
+        model = "UCS"
+
+    #
+    # initialize root node
+    #
+    Node.init_state_idx = initial_state_file
+    root: Node = Node()
+
+    if args.metrics:
+        Node.metrics = Metrics(Node.id)
+
+    # drop duplicate states which have already been reached with an EU at least as good
+    # (root-parallel search keeps a table per subtree)
+    transpositions: TranspositionTable = None
+    if transposition_size > 0 and workers <= 1 and model in frontier_map:
+        transpositions = TranspositionTable(transposition_size)
+        transpositions.check(root)
+
+    profiler: Profiler = Profiler(args.profile, output_dir) if args.profile else None
+    if profiler:
+        profiler.start()
+
+    frontier: Frontier = None
+    skip_report: SkipReport = None
+    if model == "ASTAR":
+        top_solutions, soln_count, skip_report = branch_and_bound(root, depth, soln_size, max_checks, max_nodes,
+                                                                  beam_width, progress, unique)
+    elif model == "BEAM":
+        top_solutions, soln_count = beam_search(root, depth, soln_size, max_checks, max_nodes,
+                                                beam_width, progress, unique)
+    elif model == "IDDFS":
+        top_solutions, soln_count = iterative_deepening(root, depth, soln_size, max_checks, max_nodes,
+                                                        beam_width, progress, unique)
+    elif workers > 1:
+        top_solutions, soln_count = parallel_search(root, model, depth, soln_size, max_checks, max_nodes,
+                                                    beam_width, transposition_size, workers, split_depth,
+                                                    unique, max_memory)
     else:
-        children = [n for n in node.generate_successors() if not n.force_leaf]
+        frontier = frontier_map[model](root)  # search frontier
+        # memory-bounded: spill the lowest priority entries to disk
+        if max_memory > 0:
+            frontier = SpillFrontier(frontier, root, max_memory)
+        top_solutions, soln_count = search(frontier, model, depth, soln_size, max_checks, max_nodes,
+                                           beam_width, transpositions, progress, unique)
+
+    profile_files: list = profiler.stop() if profiler else []
 
-    # append to list in reverse order for Depth (Priority Stack)
-    # for Best First Search, sort Frontier, and not only successors
-    if(model == "DFS"):
-        children.sort(key=lambda n: n.calc_expected_utility())
+    # written before rendering the results, so the timings only cover the search
+    metrics_file: str = Node.metrics.write(output_dir, Node.id, model=model, workers=workers,
+                                           states_checked=soln_count) if Node.metrics else None
 
-    # Beam search: while still generating all successors, fine tune and only pursue those with highest quality
-    while len(children) > beam_width:
-        removed_soln = children.pop(0)
+    # Store Soltions in a 'pickled' list to learn from
+    soln_pickle = "soln.pickle"
+    with open(soln_pickle, 'wb') as outfile:
+        pickle.dump(top_solutions, outfile)
 
-    # append successors to frontier
-    frontier.extend(children)
+    visualize.print_schedules(output_dir, top_solutions, soln_count)
 
-    # Best First Search/Uniform Cost Search
-    # only sort successors prior to placing on frontier vs. sorting entire frontier
-    # WARNING: this does impact the performance of the search
-    if(model == "UCS"):
-        frontier.sort(key=lambda n: n.calc_expected_utility())
+    if transpositions:
+        print(transpositions.summary())
 
+    if skip_report:
+        print(skip_report.summary())
 
-# Store Soltions in a 'pickled' list to learn from
-soln_pickle = "soln.pickle"
-with open(soln_pickle, 'wb') as outfile:
-    pickle.dump(top_solutions, outfile)
+    if isinstance(frontier, SpillFrontier):
+        print(frontier.summary())
+        frontier.close()
 
+    if metrics_file:
+        print(f'Metrics: {metrics_file}')
 
-visualize.print_schedules(output_dir, top_solutions, soln_count)
+    for profile_file in profile_files:
+        print(f'Profile: {profile_file}')
@@ -5,7 +5,6 @@ Misc Math functions
 '''
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 # basic sigmoid function implementation
 
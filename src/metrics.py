@@ -0,0 +1,92 @@
+'''
+
+Search Metrics -
+
+Optional telemetry collected while searching (enabled by setting Node.metrics to a Metrics instance):
+
+expansions  - nodes expanded (or rollout steps taken) per depth, and the successors kept for them,
+              giving the branching factor per depth
+pruned      - successors dropped, by reason:
+              threshold (Node.threshold), sched_threshold (Node.sched_threshold), beam (beam width cut),
+              not_viable (is_viable rejection), transposition (duplicate state),
+              policy (expansion replaced by a policy shortcut),
+              bound (subtree cut by branch and bound: it can't reach the top solutions)
+timers      - total seconds/calls spent generating successors, sampling a successor (rollouts),
+              evaluating quality and copying states. Timers are inclusive
+              (successor generation includes the copies and quality evaluations of the successors)
+stops       - why the search (or each subtree/rollout batch) ended
+
+The report is written as json (metrics.json) into the run's output_dir.
+Worker processes collect their own Metrics, and send back state() to be merged into the parent's.
+
+'''
+
+import os
+import json
+import time
+from collections import Counter
+
+
+class Metrics:
+
+    def __init__(self, start_id: int = 0):
+        self.start_time: float = time.perf_counter()
+        self.start_id: int = start_id  # Node.id when the collection started
+
+        self.expansions: Counter = Counter()  # depth -> nodes expanded
+        self.successors: Counter = Counter()  # depth -> successors kept
+        self.pruned: Counter = Counter()  # reason -> successors dropped
+        self.seconds: Counter = Counter()  # timer -> total seconds
+        self.calls: Counter = Counter()  # timer -> calls
+        self.stops: Counter = Counter()  # reason -> searches ended
+
+    def expanded(self, depth: int, successors: int):
+        self.expansions[depth] += 1
+        self.successors[depth] += successors
+
+    def prune(self, reason: str, count: int = 1):
+        self.pruned[reason] += count
+
+    # add the time elapsed since start (a time.perf_counter() value) to the named timer
+    def add_time(self, timer: str, start: float, calls: int = 1):
+        self.seconds[timer] += time.perf_counter() - start
+        self.calls[timer] += calls
+
+    def stop(self, reason: str):
+        self.stops[reason] += 1
+
+    # picklable counters, sent back by worker processes
+    def state(self) -> dict:
+        return {name: dict(getattr(self, name))
+                for name in ('expansions', 'successors', 'pruned', 'seconds', 'calls', 'stops')}
+
+    def merge(self, state: dict):
+        for name, counts in state.items():
+            getattr(self, name).update(counts)
+
+    def report(self, node_id: int, **extra) -> dict:
+        elapsed: float = time.perf_counter() - self.start_time
+        generated: int = node_id - self.start_id
+
+        depths: list = sorted(set(self.expansions) | set(self.successors))
+        return {
+            **extra,
+            'elapsed': elapsed,
+            'nodes_generated': generated,
+            'nodes_per_sec': generated / elapsed if elapsed > 0 else 0.,
+            'stops': dict(self.stops),
+            'depths': {str(d): {
+                'expansions': self.expansions[d],
+                'successors': self.successors[d],
+                'branching_factor': self.successors[d] / self.expansions[d] if self.expansions[d] else 0.,
+            } for d in depths},
+            'pruned': dict(self.pruned),
+            'timers': {timer: {'seconds': seconds, 'calls': self.calls[timer]}
+                       for timer, seconds in sorted(self.seconds.items())},
+        }
+
+    def write(self, output_dir: str, node_id: int, **extra) -> str:
+        output_file: str = os.path.join(output_dir, 'metrics.json')
+        with open(output_file, 'w') as outfile:
+            json.dump(self.report(node_id, **extra), outfile, indent=2)
+        return output_file
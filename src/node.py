@@ -1,11 +1,16 @@
 from dataclasses import dataclass, field
 import copy
 import math
+import numpy as np
 from resource import Resource
 from country import Country
-from world import WorldState
-from events import Action, action_map
+from world import WorldState, CompactWorldState
+from events import Action, ActionRecord, action_map
 from quality import calc_quality
+from bound import remaining_eu_bound
+import mathfunctions
+from time import perf_counter
+from metrics import Metrics
 
 # define Node class so that can be referenced for redefining as Composite/Recursive manner
 
@@ -24,7 +29,8 @@ Uses a composite like pattern, and tracks the "world state".
 Each node is a representation of the world state after N events have occured (given depth of search)
 
 children: the successors of the cur rent world state
-schedule: list of events/actions which led to this state
+record: structured record (action id, kwargs, factor) of the action which led to this state
+schedule: list of events/actions which led to this state (rebuilt from the parent chain on demand)
 schedule_probablity: likelihood an event
 
 '''
@@ -41,6 +47,21 @@ class Node():
     # acceptible schedule success probability, used for pruning based on definable threshold
     sched_threshold = 0.50
     threshold = 0.50
+    compact: bool = False  # use the array-backed CompactWorldState for the search
+    # score all Transfer candidates as NumPy arrays, and only build Nodes for those passing the thresholds
+    # (False: reference implementation, building a Node for every viable candidate)
+    batch_transfers: bool = True
+    metrics: Metrics = None  # optional telemetry collector (see metrics)
+
+    # tradable resources, and percentages of a Country's stock offered in a Transfer
+    # "R21'", "R22'", "R23'"]
+    transfer_resources: list = ["R2", "R3",
+                                "R21", "R22", "R21'", "R22'", "R23'"]
+    percent_interval: list = [1.00, .75, .5, .25, .10]
+
+    # class level search settings, handed to worker processes (see settings/configure)
+    setting_names: tuple = ('init_state_idx', 'gamma', 'sched_threshold', 'threshold',
+                            'compact', 'batch_transfers', 'transfer_resources', 'percent_interval')
 
     # composite/tree pattern, can link back through parents to learn full path
     def __init__(self, parent: Node = None, state: WorldState = None, action: str = "", **kwargs):
@@ -54,33 +75,47 @@ class Node():
         self.depth: int = 0  # the schedule/number of events triggered at given 'layer' in search
         self.action_map = action_map
 
-        # describes the history which led to this specific node/state
-        # NOTE: may replace with a function which builds the schedule by chaining together parent node calls
-        self.schedule: list = []
-        self.actions: list = []
-        self.schedule_probability: list = [1.0, ]
-        # Expected Utility is the sum of incremental increases at each step determined by the discounted reward
-        self.expected_utility: list = [0., ]
+        # describes the action which led to this specific node/state.
+        # the history (schedule, actions, ...) is built by chaining together parent node records
+        self.record: ActionRecord = None
+        self.applied: bool = False  # whether the action was viable, and applied to the state
 
         self.likelihood = 1.0  # probability of the current specific action succeeding
+        # Expected Utility is the sum of incremental increases at each step determined by the discounted reward
+        self.discounted_reward: float = 0.
+
+        # computed once when the node is built, and kept as scalars (see calc_* methods)
+        self.quality: float = 0.  # intrinsic quality of the state
+        self.reward: float = 0.  # net gain in quality from the parent state
+        self.cumulative_eu: float = 0.  # sum of the expected_utility list
+        self.cumulative_probability: float = 1.0  # product of the schedule_probability list
 
         # transition states to scan next.
         self.children: list = []
 
-        # deep copy required to prevent from modifying/passing around a single state object between depths
-        self.state: WorldState = copy.deepcopy(state)
-        if not state:
-            self.state = WorldState(Node.init_state_idx)
+        metrics: Metrics = Node.metrics
+
+        # copy required to prevent from modifying/passing around a single state object between depths
+        if state:
+            start: float = perf_counter() if metrics else 0.
+            self.state: WorldState = state.copy()
+            if metrics:
+                metrics.add_time('copy', start)
+        else:
+            self.state = CompactWorldState.load(Node.init_state_idx) if Node.compact \
+                else WorldState(Node.init_state_idx)
             # self.state.countries[0].print()
 
         #
         self.parent: Node = parent
         if parent:
             self.depth = parent.depth + 1
-            self.actions = [*parent.actions, action]
-            self.schedule = [*parent.schedule, action]
-            self.schedule_probability = [*parent.schedule_probability, ]
-            self.expected_utility = [*parent.expected_utility, ]
+            self.record = ActionRecord(action, kwargs, None)
+            self.quality = parent.quality
+            self.cumulative_eu = parent.cumulative_eu
+            self.cumulative_probability = parent.cumulative_probability
+        else:
+            self.quality = calc_quality(self.state)
 
         # apply action to parent Node to produce new State
         self.action: str = action
@@ -91,44 +126,70 @@ class Node():
             self.likelihood = self.action_map[action].probability(
                 self.state, **kwargs)
 
-            self.schedule_probability.append(self.likelihood)
+            self.cumulative_probability *= self.likelihood
 
-            if self.likelihood < Node.threshold or \
-                    self.calc_schedule_probability() < Node.sched_threshold:
+            if self.likelihood < Node.threshold:
                 self.force_leaf = True
+                if metrics:
+                    metrics.prune('threshold')
+            elif self.calc_schedule_probability() < Node.sched_threshold:
+                self.force_leaf = True
+                if metrics:
+                    metrics.prune('sched_threshold')
 
-            factor = self.action_map[action].apply(self.state, **kwargs)
-
-            self.expected_utility.append(self.calc_discounted_reward())
-            # TODO - procress kwargs into action
             # factor is the applied number of units of the underlying transform
-            self.schedule[-1] += f' x {factor} \t Q:{round(self.calc_quality(), 3)} \t EU:{round(self.calc_expected_utility(),3)}'
+            factor = self.action_map[action].apply(self.state, **kwargs)
+            self.record = ActionRecord(action, kwargs, factor)
+            self.applied = True
+
+            start: float = perf_counter() if metrics else 0.
+            self.quality = calc_quality(self.state)
+            if metrics:
+                metrics.add_time('quality', start)
+            self.reward = self.quality - parent.quality if parent else 0.
+
+            self.discounted_reward = self.calc_discounted_reward()
+            self.cumulative_eu += self.discounted_reward
+
+    # current search settings as a plain (picklable) dict, including the logistic curve steepness
+    @classmethod
+    def settings(cls) -> dict:
+        settings: dict = {name: getattr(cls, name) for name in cls.setting_names}
+        settings['k'] = mathfunctions.k
+        return settings
+
+    @classmethod
+    def configure(cls, settings: dict):
+        for name, value in settings.items():
+            if name == 'k':
+                mathfunctions.k = value
+            elif name in cls.setting_names:
+                setattr(cls, name, value)
+            else:
+                raise KeyError(f'unknown search setting: {name}')
 
     # The intrinsic quality of the State.
 
     def calc_quality(self):
-        return calc_quality(self.state)
+        return self.quality
 
-    # A* search
-    def calc_a_star(self, h=None) -> float:
-        return self.calc_quality() + self.calc_heuristic()
+    # A* search (branch and bound): the Expected Utility, plus the most it could still gain before the depth limit
+    def calc_a_star(self, depth: int) -> float:
+        return self.calc_expected_utility() + self.calc_heuristic(depth)
 
     # defined as the "Net Gain" (or loss) from the Action which led to this Node.
     # N - (N - 1)
     def calc_reward(self) -> float:
-        quality = self.calc_quality()
-        prev_quality = quality
-        if(self.parent):
-            prev_quality = self.parent.calc_quality()
-        return quality - prev_quality
+        return self.reward
 
     # defined as the 'net gain' discounted for having been on a schedule, and further discounted by probability of (acceptance/likelihood)
     def calc_discounted_reward(self) -> float:
         return (Node.gamma ** self.depth) * self.calc_reward() * self.likelihood
 
-    def calc_heuristic(self, h=None) -> float:
-        # define the heuristic
-        return self.calc_discounted_reward()
+    # admissible heuristic: an upper bound on the Expected Utility still reachable before the depth limit (see bound)
+    def calc_heuristic(self, depth: int) -> float:
+        return remaining_eu_bound(self.state, self.calc_quality(), self.depth, depth,
+                                  Node.gamma, Node.transfer_resources)
 
     # check whether or not bounded/requested depth has been reached
     def is_solution(self, provided_depth) -> bool:
@@ -137,10 +198,10 @@ class Node():
         return provided_depth <= self.depth
 
     def calc_schedule_probability(self) -> float:
-        return math.prod(self.schedule_probability)
+        return self.cumulative_probability
 
     def calc_expected_utility(self) -> float:
-        return sum(self.expected_utility)
+        return self.cumulative_eu
 
     # transition the Node in a single path dictected by the specific action, returning
 
@@ -156,6 +217,14 @@ class Node():
 
         return result
 
+    # rebuild a schedule from its action records (ex: a schedule returned by a worker process)
+    def replay(self, records) -> Node:
+        result = self
+        for action_id, kwargs, _ in records:
+            result = Node(result, result.state, action_id, **kwargs)
+
+        return result
+
     '''
     Generate Successors
     Expands the current Node in all possible ways:
@@ -163,6 +232,13 @@ class Node():
     '''
 
     def generate_successors(self) -> list:
+        self.children = self.successors()
+        return self.children
+
+    # all successors, without keeping them on the node (ex: expanding a shared root)
+    def successors(self) -> list:
+        metrics: Metrics = Node.metrics
+        start: float = perf_counter() if metrics else 0.
         children: list = []
 
         for action_id in self.action_map.keys():
@@ -176,8 +252,11 @@ class Node():
             if action.is_viable(self.state):
                 child: Node = Node(self, self.state, action_id)
                 children.append(child)
+            elif metrics:
+                metrics.prune('not_viable')
 
-        self.children = children
+        if metrics:
+            metrics.add_time('successors', start)
         return children
 
     '''
@@ -193,17 +272,20 @@ class Node():
     '''
 
     def generate_transfer_successors(self) -> list[Node]:
+        if Node.batch_transfers:
+            return self.generate_batched_transfer_successors()
+
         world = self.state
+        ix: dict = world.table.index
         action_id: str = 'Transfer'
         action: Action = action_map[action_id]
 
-        # "R21'", "R22'", "R23'"]
-        resource_list: list = ["R2", "R3",
-                               "R21", "R22", "R21'", "R22'", "R23'"]
-        percent_interval: list = [1.00, .75, .5, .25, .10]
+        resource_list: list = Node.transfer_resources
+        percent_interval: list = Node.percent_interval
         # Building a Schedule for Country '0' - Atlantis
         c1_idx = 0
-        c1 = world.countries[c1_idx]
+        quantities: list = world.as_array().tolist()
+        c1: list = quantities[c1_idx]
 
         # 5- for loop structure using list comprehensions
         # max fan out/complexity:
@@ -215,12 +297,12 @@ class Node():
 
                             for r2_offer in resource_list if r2_offer is not r1_offer
 
-                            for r1_qty in (int(r1_pct * c1.resources[r1_offer].quantity)
+                            for r1_qty in (int(r1_pct * c1[ix[r1_offer]])
                                            for r1_pct in percent_interval) if r1_qty != 0
 
-                            for c2_idx in range(len(world.countries)) if c2_idx is not c1_idx
+                            for c2_idx in range(len(quantities)) if c2_idx is not c1_idx
 
-                            for r2_qty in (int(r2_pct * self.state.countries[c2_idx].resources[r2_offer].quantity)
+                            for r2_qty in (int(r2_pct * quantities[c2_idx][ix[r2_offer]])
                                            for r2_pct in percent_interval) if r2_qty != 0
 
                             ) if n is not None]
@@ -249,6 +331,69 @@ class Node():
                 self, self.state, 'Transfer', **proposition)
             return child
 
+        if Node.metrics:
+            Node.metrics.prune('not_viable')
+
+    '''
+    Batched Transfer Successors:
+    Same candidates (and order) as generate_transfer_successors, but built as NumPy arrays:
+    1) Build the full (r1, r2, q1, c2, q2) grid at once
+    2) Compute viability and the Transfer probability sigmoid over the whole grid
+    3) Only build Nodes for candidates which pass Node.threshold and Node.sched_threshold
+       (the rest would only become forced leaf nodes)
+    '''
+
+    def generate_batched_transfer_successors(self) -> list[Node]:
+        return [Node(self, self.state, 'Transfer', **self.transfer_kwargs(*candidate))
+                for candidate in zip(*(a.tolist() for a in self.transfer_candidates()[:5]))]
+
+    # (c2, r1, q1, r2, q2, likelihood) arrays of the viable Transfers from Country 0 passing the thresholds
+    def transfer_candidates(self) -> tuple:
+        world = self.state
+        action: Action = action_map['Transfer']
+        quantities: np.ndarray = world.as_array()
+
+        resources: np.ndarray = np.array(
+            [world.table.index[r] for r in Node.transfer_resources])
+        percents: np.ndarray = np.array(Node.percent_interval)
+        c1_idx = 0
+        partners: np.ndarray = np.array(
+            [c for c in range(len(quantities)) if c != c1_idx])
+
+        # flattened in the same nested order as the scalar generator
+        r1, r2, p1, c2, p2 = (a.ravel() for a in np.meshgrid(
+            resources, resources, percents, partners, percents, indexing='ij'))
+
+        q1 = (p1 * quantities[c1_idx, r1]).astype(np.int64)
+        q2 = (p2 * quantities[c2, r2]).astype(np.int64)
+
+        candidates = (r1 != r2) & (q1 != 0) & (q2 != 0)
+        r1, r2, q1, c2, q2 = (a[candidates] for a in (r1, r2, q1, c2, q2))
+
+        likelihood = action.probability_batch(world, r1, q1, r2, q2)
+        viable = action.is_viable_batch(world, c1_idx, c2, r1, q1, r2, q2)
+        likely = viable & (likelihood >= Node.threshold)
+        passing = likely \
+            & (self.calc_schedule_probability() * likelihood >= Node.sched_threshold)
+
+        # same reasons (and counts) as building every Node: rejected by is_viable, or forced to a leaf
+        if Node.metrics:
+            Node.metrics.prune('not_viable', int(len(viable) - viable.sum()))
+            Node.metrics.prune('threshold', int(viable.sum() - likely.sum()))
+            Node.metrics.prune('sched_threshold', int(likely.sum() - passing.sum()))
+
+        return tuple(a[passing] for a in (c2, r1, q1, r2, q2, likelihood))
+
+    # Transfer proposition (see events.Transfer) from Country 0, for a candidate of transfer_candidates
+    def transfer_kwargs(self, c2_idx: int, r1_idx: int, r1_qty: int, r2_idx: int, r2_qty: int) -> dict:
+        names: tuple = self.state.table.names
+        return {
+            'c1': 0,
+            'c2': c2_idx,
+            'c1_offer': {'resource': names[r1_idx], 'quantity': r1_qty},
+            'c2_offer': {'resource': names[r2_idx], 'quantity': r2_qty},
+        }
+
     '''
     Look-ahead
     
@@ -263,15 +408,56 @@ class Node():
 
         return self.children[0]
 
+    '''
+    Schedule/History:
+    Rebuilt on demand from the parent chain, so nodes don't each carry (and copy) their own lists
+    '''
+
+    # nodes from the first action taken up to (and including) this node
+    def path(self) -> list:
+        nodes: list = []
+        node: Node = self
+        while node.parent:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    # list of action records which led to this state
+    @property
+    def schedule(self) -> list:
+        return [n.record for n in self.path()]
+
+    @property
+    def actions(self) -> list:
+        return [n.record.action for n in self.path()]
+
+    @property
+    def schedule_probability(self) -> list:
+        return [1.0, *(n.likelihood for n in self.path() if n.applied)]
+
+    @property
+    def expected_utility(self) -> list:
+        return [0., *(n.discounted_reward for n in self.path() if n.applied)]
+
+    # render the action which led to this node, ex: 'Template - Housing x 33 \t Q:201.366 \t EU:58.084'
+    def describe(self) -> str:
+        action, kwargs, factor = self.record
+        if not self.applied:
+            return action
+
+        description: str = self.action_map[action].describe(
+            self.state, factor, **kwargs)
+        return f'{action} x {description} \t Q:{round(self.calc_quality(), 3)} \t EU:{round(self.calc_expected_utility(),3)}'
+
     '''
     Convenience method for printing out the Schedule of the Node/WorldState
     '''
 
     def get_schedule(self) -> str:
         result: str = ''
-        for i in range(len(self.schedule)):
-            entry = self.schedule[i]
-            ln = f'{i+1}: {entry}\n'
+        for i, node in enumerate(self.path()):
+            ln = f'{i+1}: {node.describe()}\n'
             result += ln
         result += f'Schedule Probability: {self.schedule_probability} = {self.calc_schedule_probability()}\n'
         result += f'id: {self.id}\n'
@@ -107,3 +107,7 @@ def reset_policy_checks():
 
 def reload_policy():
     TopSolutionPolicy.action_list.clear()
+
+
+def skip_policy_checks():
+    TopSolutionPolicy.checked = True
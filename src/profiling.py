@@ -0,0 +1,156 @@
+'''
+
+Search Profiling -
+
+Optional profiling of a search run (--profile on main.py/main-stochastic.py, profile on the Flask /run endpoint),
+written into the run's output_dir:
+
+cpu - cProfile stats of the search (profile-cpu.prof, readable with pstats/snakeviz),
+      a summary sorted by cumulative time (profile-cpu.txt),
+      and collapsed stacks sampled every interval seconds from a daemon thread (profile-cpu.collapsed),
+      one "frame;frame;...;frame count" line per stack, readable by flamegraph tools (flamegraph.pl, speedscope)
+mem - tracemalloc snapshots: the top allocation sites (by line, and by traceback)
+      of the largest snapshot taken while searching (profile-mem.txt)
+
+Only the calling process is profiled: with --workers, the worker processes are not.
+
+'''
+
+import os
+import sys
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+
+profile_modes: list = ['cpu', 'mem']
+
+
+class Profiler:
+
+    def __init__(self, mode: str, output_dir: str, interval: float = 0.005, top: int = 25):
+        if mode not in profile_modes:
+            raise ValueError(f'Unknown profile mode: {mode}')
+        self.mode: str = mode
+        self.output_dir: str = output_dir
+        self.interval: float = interval  # seconds between stack samples (cpu) or memory checks (mem)
+        self.top: int = top  # number of functions/allocation sites reported
+
+        self.profile: cProfile.Profile = None
+        self.stacks: Counter = Counter()  # collapsed stack -> samples
+        self.snapshot: tracemalloc.Snapshot = None  # largest snapshot so far
+        self.snapshot_size: int = 0
+
+        self.thread_id: int = None  # thread being profiled
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+
+        if self.mode == 'cpu':
+            self.profile = cProfile.Profile()
+            self.thread = threading.Thread(target=self.sample_stacks, daemon=True)
+            self.thread.start()
+            self.profile.enable()
+        else:
+            tracemalloc.start(10)
+            self.thread = threading.Thread(target=self.sample_memory, daemon=True)
+            self.thread.start()
+
+    # stops profiling and writes the results, returns the files written
+    def stop(self) -> list:
+        if self.mode == 'cpu':
+            self.profile.disable()
+        self.stopped.set()
+        self.thread.join()
+
+        if self.mode == 'cpu':
+            return self.write_cpu()
+
+        self.take_snapshot()
+        peak: int = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return self.write_mem(peak)
+
+    '''
+    CPU: sampled stacks of the profiled thread
+    '''
+
+    def sample_stacks(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: list = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write_cpu(self) -> list:
+        stats_file: str = os.path.join(self.output_dir, 'profile-cpu.prof')
+        self.profile.dump_stats(stats_file)
+
+        summary_file: str = os.path.join(self.output_dir, 'profile-cpu.txt')
+        with open(summary_file, 'w') as outfile:
+            stats = pstats.Stats(self.profile, stream=outfile)
+            stats.sort_stats('cumulative').print_stats(self.top)
+
+        collapsed_file: str = os.path.join(self.output_dir, 'profile-cpu.collapsed')
+        with open(collapsed_file, 'w') as outfile:
+            for stack, count in self.stacks.most_common():
+                outfile.write(f'{stack} {count}\n')
+
+        return [stats_file, summary_file, collapsed_file]
+
+    '''
+    Memory: keep the snapshot taken at the largest traced size
+    (the search frees most of its Nodes before it ends, so a final snapshot alone misses them)
+    '''
+
+    def sample_memory(self):
+        while not self.stopped.wait(self.interval):
+            current: int = tracemalloc.get_traced_memory()[0]
+            if current > self.snapshot_size * 1.1:
+                self.take_snapshot()
+
+    def take_snapshot(self):
+        current: int = tracemalloc.get_traced_memory()[0]
+        if current > self.snapshot_size:
+            self.snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            ])
+            self.snapshot_size = current
+
+    def write_mem(self, peak: int) -> list:
+        mem_file: str = os.path.join(self.output_dir, 'profile-mem.txt')
+        with open(mem_file, 'w') as outfile:
+            outfile.write(f'Peak traced memory: {round(peak / 1024)} KiB\n')
+            outfile.write(f'Largest snapshot: {round(self.snapshot_size / 1024)} KiB\n\n')
+
+            outfile.write(f'Top {self.top} allocation sites (by line):\n')
+            for i, stat in enumerate(self.snapshot.statistics('lineno')[:self.top]):
+                frame = stat.traceback[0]
+                outfile.write(f'{i+1:>3}: {frame.filename}:{frame.lineno}: '
+                              f'{round(stat.size / 1024, 1)} KiB in {stat.count} blocks\n')
+
+            outfile.write(f'\nTop {self.top // 2} allocation sites (by traceback, most recent call last):\n')
+            for i, stat in enumerate(self.snapshot.statistics('traceback')[:self.top // 2]):
+                outfile.write(f'\n{i+1:>3}: {round(stat.size / 1024, 1)} KiB in {stat.count} blocks\n')
+                for line in stat.traceback.format():
+                    outfile.write(f'     {line}\n')
+
+        return [mem_file]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
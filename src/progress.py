@@ -0,0 +1,104 @@
+'''
+
+Progress Reporter -
+
+Live progress of a long search, redrawn in place (ANSI escapes) on its own daemon thread, every interval seconds.
+The search loop only updates plain counters (ex: reporter.checked), it never waits on the reporter:
+the reporter reads the counters, Node.id, the frontier size and a snapshot of the top solutions.
+
+Only enabled when stdout is a terminal (or forced on), so headless/batch runs never start the thread.
+
+'''
+
+import sys
+import time
+import shutil
+import threading
+
+from node import Node
+from topk import TopK
+
+
+# 'auto': only report progress on an interactive terminal
+def progress_enabled(mode: str = 'auto') -> bool:
+    if mode == 'auto':
+        return sys.stdout.isatty()
+    return mode == 'on'
+
+
+class ProgressReporter:
+
+    def __init__(self, interval: float = 1.0, stream=None):
+        self.interval: float = interval
+        self.stream = stream or sys.stdout
+
+        # updated by the search loop
+        self.checked: int = 0
+
+        self.top_solutions: TopK = None
+        self.frontier = None
+
+        self.start_time: float = 0.
+        self.start_id: int = 0
+        self.lines: int = 0  # lines drawn last time, to redraw over
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = None
+
+    def watch(self, top_solutions: TopK, frontier=None):
+        self.top_solutions = top_solutions
+        self.frontier = frontier
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.start_id = Node.id
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            self.draw()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.draw()
+
+    def render(self) -> list:
+        elapsed: float = time.perf_counter() - self.start_time
+        generated: int = Node.id - self.start_id
+        rate: float = generated / elapsed if elapsed > 0 else 0.
+
+        line: str = f'Nodes generated: {generated} ({round(rate)}/s) | States checked: {self.checked}'
+        if self.frontier is not None:
+            line += f' | Frontier: {len(self.frontier)}'
+        lines: list = [line + f' | Elapsed: {round(elapsed, 1)}s']
+
+        if self.top_solutions is not None:
+            # copying the heap is a single (atomic) list copy, the search keeps on pushing to the original
+            heap: list = list(self.top_solutions.heap)
+            for i, (eu, _, node) in enumerate(sorted(heap, key=lambda e: (-e[0], -e[1]))):
+                lines.append(f'{i+1}: EU: {round(eu, 3)}  Q: {round(node.calc_quality(), 3)}  '
+                             f'{" > ".join(node.actions)}')
+
+        # one terminal row per line, so the next redraw moves back over exactly these
+        width: int = shutil.get_terminal_size().columns
+        return [line[:width] for line in lines]
+
+    def draw(self):
+        lines: list = self.render()
+
+        # move back up over the previous report, clearing each line
+        redraw: str = f'\x1b[{self.lines}F' if self.lines else ''
+        self.stream.write(redraw + ''.join(f'\x1b[2K{line}\n' for line in lines) + '\x1b[J')
+        self.stream.flush()
+        self.lines = len(lines)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
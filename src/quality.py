@@ -1,4 +1,5 @@
-from world import WorldState
+import numpy as np
+from world import WorldState, ResourceTable
 from resource import Resource
 from goals import goal_map
 
@@ -25,3 +26,27 @@ def calc_quality(state: WorldState, country_idx=0) -> float:
 
     q = housing_goal+electronics_goal+waste_goal+resource_on_hand_goal
     return q
+
+
+'''
+Batched State Quality -
+
+Vectorized equivalent of calc_quality, scoring N candidate states in one call.
+Agrees with calc_quality up to floating point rounding (NumPy may use SIMD pow for arrays).
+states is a stacked resource array: either (N x countries x resources) world matrices,
+or (N x resources) rows of the country being scored.
+
+'''
+
+
+def calc_quality_batch(states: np.ndarray, table: ResourceTable, country_idx=0) -> np.ndarray:
+    rows: np.ndarray = states[:, country_idx] if states.ndim == 3 else states
+
+    housing_goal = goal_map['housing'].progress_batch(rows, table)
+    electronics_goal = goal_map['electronics'].progress_batch(rows, table)
+    waste_goal = goal_map['waste'].progress_batch(rows, table)
+    resource_on_hand_goal = goal_map['raw_resources'].progress_batch(
+        rows, table)
+
+    q = housing_goal+electronics_goal+waste_goal+resource_on_hand_goal
+    return q
@@ -46,10 +46,12 @@ Resources also have a function which gives an aggregate admissible heuristic
 (metric based on its "least useful" attribute based on how a resource gets utiltized in the least useful way)
 This is also akin to a Mini-Max search, in which the "opponent" is minimizing the value I can get out of a resource.
 
+Resources are immutable values (shared between World States): a change in quantity produces a new Resource.
+
 '''
 
 
-@dataclass
+@dataclass(frozen=True)
 class Resource:
 
     resource_id: int = 0
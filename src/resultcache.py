@@ -0,0 +1,159 @@
+'''
+
+Result Cache -
+
+Results of the Flask service's searches (see FlaskApp /run and /jobs), keyed on their full parameter set
+(random seed included) and on the scenario files they were run on (path and modification time),
+so repeated requests are answered without searching or rendering again.
+
+A result is the response of a search: its text, and its charts as PNG bytes ('images'),
+stored apart and served by index (see FlaskApp /images), so the cached response only holds their count.
+
+Two layers:
+memory - the max_size most recently used results (least recently used evicted first)
+disk   - every result, as json files (and their charts as png files) under directory (schedules/cache),
+         so they outlive the process. A disk hit is loaded back into memory (its charts are read on demand)
+
+save and profile aren't part of the key: they don't change the result.
+Profiled results are never cached (their response lists profile files of that run):
+their charts are kept in memory only (keep), under a key of their own, for the transient_size most recent.
+
+Requests without a seed are random runs: their first result is kept for that parameter set,
+a fresh run (force) replaces it.
+
+'''
+
+import os
+import json
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+import world
+
+
+# request parameters which don't change the result
+ignored_params: tuple = ('save', 'profile')
+
+
+class ResultCache:
+
+    def __init__(self, directory: str = 'schedules/cache', max_size: int = 32):
+        self.directory: str = directory
+        self.max_size: int = max_size
+        self.table: OrderedDict = OrderedDict()
+        self.transient: OrderedDict = OrderedDict()  # key -> charts of results which aren't cached
+        self.transient_size: int = max_size
+        self.lock: threading.Lock = threading.Lock()  # requests and finished jobs are handled on several threads
+
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    def key(self, params: dict) -> str:
+        scenario: list = [world.resources_file, world.countries_file.format(params['initial_state_file'])]
+        versions: list = [(path, os.stat(path).st_mtime_ns if os.path.exists(path) else None) for path in scenario]
+        params = {name: value for name, value in params.items() if name not in ignored_params}
+        fingerprint: str = json.dumps({'params': params, 'scenario': versions}, sort_keys=True)
+        return hashlib.blake2b(fingerprint.encode(), digest_size=16).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    # cached result of a parameter set ('images': the number of charts), None if it hasn't been run
+    def get(self, params: dict) -> dict:
+        key: str = self.key(params)
+        with self.lock:
+            entry: tuple = self.table.get(key)
+            if entry is not None:
+                self.table.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        try:
+            with open(self.path(key)) as infile:
+                result = json.load(infile)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.disk_hits += 1
+            self.remember(key, result, None)
+        return result
+
+    # stores a result ('images': its charts as PNG bytes), returns its key
+    def put(self, params: dict, result: dict) -> str:
+        key: str = self.key(params)
+        images: list = result.get('images', [])
+        result = {**result, 'images': len(images)}
+        with self.lock:
+            self.remember(key, result, images)
+
+        # the charts first, then the result: a result found on disk always has its charts
+        os.makedirs(self.directory, exist_ok=True)
+        for i, image in enumerate(images):
+            self.write(self.image_path(key, i+1), image)
+        self.write(self.path(key), json.dumps(result).encode())
+        return key
+
+    # keeps the charts of a result which isn't cached (in memory only), returns their key
+    def keep(self, result: dict) -> str:
+        key: str = uuid.uuid4().hex
+        with self.lock:
+            self.transient[key] = result.get('images', [])
+            if len(self.transient) > self.transient_size:
+                self.transient.popitem(last=False)
+        return key
+
+    # chart index (from 1) of a stored result, None if unknown
+    def image(self, key: str, index: int) -> bytes:
+        if not key.isalnum():
+            return None
+
+        with self.lock:
+            entry: tuple = self.table.get(key)
+            images: list = self.transient.get(key)
+        if entry is not None and entry[1] is not None:
+            images = entry[1]
+        if images is not None:
+            return images[index-1] if 0 < index <= len(images) else None
+
+        try:
+            with open(self.image_path(key, index), 'rb') as infile:
+                return infile.read()
+        except OSError:
+            return None
+
+    def image_path(self, key: str, index: int) -> str:
+        return os.path.join(self.directory, f'{key}-{index}.png')
+
+    # written then renamed, so a concurrent reader never loads a partial file
+    def write(self, path: str, data: bytes):
+        temp_file: str = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp_file, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(temp_file, path)
+
+    # images: the charts, None when they are left on disk
+    def remember(self, key: str, result: dict, images: list):
+        self.table[key] = (result, images)
+        self.table.move_to_end(key)
+        if len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+
+    # drops both layers
+    def clear(self):
+        with self.lock:
+            self.table.clear()
+            self.transient.clear()
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith(('.json', '.png')):
+                        os.remove(os.path.join(self.directory, name))
+
+    def summary(self) -> dict:
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'in_memory': len(self.table)}
@@ -0,0 +1,127 @@
+'''
+
+Successor Samplers -
+
+Used by the rollout engine (see traverse) to pick a single successor of a Node,
+weighted by (discounted) Expected Utility.
+
+Samplers:
+
+full    - reference implementation: builds every successor Node, then samples one
+batched - scores every Transfer candidate as NumPy arrays (quality of Country 0's resulting row),
+          and only builds the Node for the sampled successor.
+          Samples from the same distribution as the full sampler
+          (candidate EUs agree up to floating point rounding, see quality.calc_quality_batch)
+
+'''
+
+import math
+import time
+import random
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from node import Node
+from quality import calc_quality_batch
+
+
+'''
+Weighted pseudo-random selection:
+candidates are ordered by Expected Utility (ascending), shifted by the min weight,
+and weighted by exp(EU). Returns the index of the selected candidate
+'''
+
+
+def weighted_choice(eus: list) -> int:
+    order: list = sorted(range(len(eus)), key=lambda i: eus[i])
+
+    # use expected utility to weight the decision tree
+    weights: list = [eus[i] for i in order]
+
+    # calc min weight to use as a shift constant towards a small number
+    min_weight = abs(min(weights))
+    weights = [w+min_weight for w in weights]
+    if sum(weights) == 0:
+        weights = [1. for w in weights]
+
+    return random.choices(order, [math.exp(w) for w in weights], k=1)[0]
+
+
+class Sampler(ABC):
+
+    # returns the sampled successor, or None if the Node has no (non-leaf) successors
+    @abstractmethod
+    def sample(self, node: Node) -> Node:
+        pass
+
+
+class FullExpansionSampler(Sampler):
+
+    def sample(self, node: Node) -> Node:
+        children: list = [n for n in node.successors() if not n.force_leaf]
+        if Node.metrics:
+            Node.metrics.expanded(node.depth, len(children))
+
+        if not children:
+            return None
+
+        return children[weighted_choice([n.calc_expected_utility() for n in children])]
+
+
+class BatchedSampler(Sampler):
+
+    def sample(self, node: Node) -> Node:
+        # candidates are kept in the same order as Node.successors(), either a built Node or a Transfer index
+        candidates: list = []
+        eus: list = []
+
+        for action_id, action in node.action_map.items():
+            if action_id == 'Transfer':
+                transfers: tuple = node.transfer_candidates()
+                candidates.extend(range(len(transfers[0])))
+                eus.extend(self.transfer_eus(node, *transfers).tolist())
+
+            elif action.is_viable(node.state):
+                child: Node = Node(node, node.state, action_id)
+                if not child.force_leaf:
+                    candidates.append(child)
+                    eus.append(child.calc_expected_utility())
+
+            elif Node.metrics:
+                Node.metrics.prune('not_viable')
+
+        if Node.metrics:
+            Node.metrics.expanded(node.depth, len(candidates))
+
+        if not candidates:
+            return None
+
+        choice = candidates[weighted_choice(eus)]
+        if isinstance(choice, Node):
+            return choice
+
+        return Node(node, node.state, 'Transfer',
+                    **node.transfer_kwargs(*(a[choice].item() for a in transfers[:5])))
+
+    # Expected Utility of each Transfer candidate, computed without building its Node
+    @staticmethod
+    def transfer_eus(node: Node, c2, r1, q1, r2, q2, likelihood) -> np.ndarray:
+        n: np.ndarray = np.arange(len(r1))
+        rows: np.ndarray = np.repeat(
+            node.state.as_array()[0][np.newaxis], len(r1), axis=0)
+        rows[n, r1] -= q1
+        rows[n, r2] += q2
+
+        start: float = time.perf_counter() if Node.metrics else 0.
+        reward: np.ndarray = calc_quality_batch(
+            rows, node.state.table) - node.calc_quality()
+        if Node.metrics:
+            Node.metrics.add_time('quality', start)
+        return node.calc_expected_utility() + (Node.gamma ** (node.depth + 1)) * reward * likelihood
+
+
+sampler_map: dict = {
+    'full': FullExpansionSampler,
+    'batched': BatchedSampler,
+}
@@ -0,0 +1,627 @@
+'''
+
+Search -
+
+The frontier search loop driven by main.py (DFS/UCS/BUCKET), its root-parallel variant,
+iterative deepening depth first search (IDDFS), branch and bound (ASTAR) and layer-synchronous beam search (BEAM).
+
+Root-parallel search:
+The parent expands the first split_depth levels of the tree (exactly as the serial search would),
+then hands each remaining subtree to a worker process.
+Each worker runs the same frontier search over its subtree, under its share of the max_checks/max_nodes budgets,
+and returns its top solutions as compact (expected utility, action records) pairs.
+The parent merges the per-subtree top solutions, and replays the kept schedules from the root.
+
+Ties on Expected Utility are broken by the order the serial search would pop the nodes in,
+so with unlimited budgets the top solutions match the serial search
+(for UCS/BUCKET, exact ties between two different subtrees are broken by subtree order).
+Transposition tables are per subtree: duplicates reached through different subtrees are not merged.
+
+'''
+
+import math
+import heapq
+from itertools import count
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from node import Node
+from frontier import Frontier, frontier_map, BucketFrontier
+from spill import SpillFrontier
+from transposition import TranspositionTable
+from topk import TopK, schedule_key
+from progress import ProgressReporter
+from metrics import Metrics
+from sampler import BatchedSampler
+from bound import SkipReport
+import policy
+
+
+'''
+Expand a Node:
+apply the policy (if present), otherwise generate all successors,
+dropping forced leaves, beam trimming and dropping known transpositions
+'''
+
+
+def expand(node: Node, model: str, depth: int, beam_width: int,
+           transpositions: TranspositionTable = None) -> list:
+
+    metrics: Metrics = Node.metrics
+
+    policy_present = policy.meets_policy(node.state)
+    if policy_present:
+        children = [policy.apply_policy(node, policy_present, depth)]
+        if metrics:
+            metrics.prune('policy')
+
+    # if current depth is not a solution, then expand in all ways
+    # Avoid pursuing successors which fail to pass schedule
+    # additional params to override and force a branch to be terminal/a leaf node
+    # this indicates a terminal/invalid path: the leaf is not checked as a solution
+    # filter out forced_leaf nodes
+    # (successors are not kept on the node: expanded subtrees are freed once their nodes leave the frontier)
+    else:
+        children = [n for n in node.successors() if not n.force_leaf]
+
+    # append to list in reverse order for Depth (Priority Stack)
+    # for Best First Search, sort Frontier, and not only successors
+    if(model == "DFS"):
+        children.sort(key=lambda n: n.calc_expected_utility())
+
+    # Beam search: while still generating all successors, fine tune and only pursue those with highest quality
+    if len(children) > beam_width:
+        if metrics:
+            metrics.prune('beam', len(children) - beam_width)
+        del children[:len(children) - beam_width]
+
+    if transpositions:
+        kept: int = len(children)
+        children = [n for n in children if transpositions.check(n)]
+        if metrics:
+            metrics.prune('transposition', kept - len(children))
+
+    if metrics:
+        metrics.expanded(node.depth, len(children))
+    return children
+
+
+'''
+Frontier search:
+pop nodes until the frontier is exhausted, or max_checks pops/node_limit (Node.id) is reached,
+keeping the soln_size nodes with the highest Expected Utility
+'''
+
+
+def search(frontier: Frontier, model: str, depth: int, soln_size: int, max_checks: int, node_limit: int,
+           beam_width: int, transpositions: TranspositionTable = None, progress: ProgressReporter = None,
+           unique: bool = False) -> tuple:
+
+    # Collections of Nodes which represent viable solutions (depth achieved)
+    #  solutions contain the World State, history of transactions,
+    # and Utility function/measure of State quality at given step.
+    top_solutions: TopK = TopK(soln_size, node_schedule_key if unique else None)
+    soln_count: int = 0
+
+    # live progress, drawn from its own thread
+    if progress:
+        progress.watch(top_solutions, frontier)
+        progress.start()
+
+    # Continue Search as long as there exists searchable nodes/expansion where depth has not been achieved
+    while(len(frontier) > 0):
+
+        # force out of search if max_checks are achieved. Could be a range of reasons
+        # search needs to stopped prematurely after checks
+        if soln_count >= max_checks or Node.id >= node_limit:
+            if Node.metrics:
+                Node.metrics.stop('max_solutions' if soln_count >= max_checks else 'max_nodes')
+            break
+
+        # grab the last node in the list (treated as priority stack or queue)
+        node = frontier.pop()
+
+        soln_count += 1
+        if progress:
+            progress.checked = soln_count
+
+        # keep a small set of top solutions, based on expected utility
+        top_solutions.push(node, node.calc_expected_utility())
+
+        # check if bounded depth has been reached - Recursive Base Case:
+        # Avoid generating successors beyond this point
+        if node.is_solution(depth):
+            continue
+
+        # append successors to frontier
+        # Best First Search/Uniform Cost Search: the priority queue keeps the frontier ordered on push
+        frontier.extend(expand(node, model, depth, beam_width, transpositions))
+
+    else:
+        if Node.metrics:
+            Node.metrics.stop('frontier_exhausted')
+
+    if progress:
+        progress.stop()
+
+    return top_solutions.items(), soln_count
+
+
+def node_schedule_key(node: Node) -> str:
+    return schedule_key(node.schedule)
+
+
+'''
+Iterative deepening depth first search (IDDFS):
+depth limited depth first passes, with the limit raised by one each pass, up to depth.
+Each pass only checks (and keeps as top solutions) the nodes at its depth limit, shallower nodes were checked by earlier passes.
+
+Successors are generated lazily, one sibling at a time: the Expected Utility of every Transfer candidate
+is computed as arrays (without building its Node), and Nodes are only built as the pass visits them.
+Memory is O(depth): the current path, the ordered candidates of each node on it, and the top solutions.
+
+Siblings are visited best EU first (the DFS model order), trimmed to beam_width.
+The orderings are reused by the next pass, kept in a bounded (least recently used) cache keyed on the path from the root.
+'''
+
+
+def iterative_deepening(root: Node, depth: int, soln_size: int, max_checks: int, node_limit: int,
+                        beam_width: int, progress: ProgressReporter = None, unique: bool = False,
+                        cache_size: int = 10000) -> tuple:
+
+    metrics: Metrics = Node.metrics
+    top_solutions: TopK = TopK(soln_size, node_schedule_key if unique else None)
+    soln_count: int = 0
+
+    if progress:
+        progress.watch(top_solutions)
+        progress.start()
+
+    # the root is checked (and policy applied) once, a policy shortcut becomes the root of every pass
+    top_solutions.push(root, root.calc_expected_utility())
+    soln_count += 1
+
+    policy_present = policy.meets_policy(root.state)
+    if policy_present:
+        root = policy.apply_policy(root, policy_present, depth)
+        top_solutions.push(root, root.calc_expected_utility())
+        soln_count += 1
+        if metrics:
+            metrics.prune('policy')
+
+    orderings: OrderedDict = OrderedDict()  # path (sibling positions from the root) -> ordered successors
+    stop: str = 'depth_reached'
+
+    for limit in range(root.depth + 1, depth + 1):
+        reached: int = 0  # nodes at the depth limit, none: the tree is exhausted
+
+        # (node, path, successors, position of the next successor)
+        stack: list = [[root, (), successor_order(root, (), beam_width, orderings, cache_size), 0]]
+        while stack:
+            entry: list = stack[-1]
+            node, path, (order, transfers), position = entry
+            if position >= len(order):
+                stack.pop()
+                continue
+
+            if soln_count >= max_checks or Node.id >= node_limit:
+                stop = 'max_solutions' if soln_count >= max_checks else 'max_nodes'
+                break
+
+            entry[3] += 1
+            child: Node = build_successor(node, order[position], transfers)
+
+            if child.depth < limit:
+                child_path: tuple = path + (position,)
+                stack.append([child, child_path, successor_order(child, child_path, beam_width, orderings,
+                                                                 cache_size), 0])
+                continue
+
+            soln_count += 1
+            reached += 1
+            if progress:
+                progress.checked = soln_count
+            top_solutions.push(child, child.calc_expected_utility())
+
+        if stack:
+            break
+        if not reached:
+            stop = 'frontier_exhausted'
+            break
+
+    if metrics:
+        metrics.stop(stop)
+
+    if progress:
+        progress.stop()
+
+    return top_solutions.items(), soln_count
+
+
+# successors of a node, best EU first and beam trimmed:
+# (order, transfers) where order items are an action id, a built Node or an index into the transfers arrays
+def successor_order(node: Node, path: tuple, beam_width: int, orderings: OrderedDict, cache_size: int) -> tuple:
+    metrics: Metrics = Node.metrics
+
+    cached: tuple = orderings.get(path)
+    if cached is not None:
+        orderings.move_to_end(path)
+        if metrics:
+            metrics.expanded(node.depth, len(cached[0]))
+        return cached
+
+    order, _, transfers = ranked_successors(node, beam_width)
+    if metrics:
+        metrics.expanded(node.depth, len(order))
+
+    # cached without the built Nodes (rebuilt on the next pass), so the cache doesn't keep them alive
+    orderings[path] = ([c.action if isinstance(c, Node) else c for c in order], transfers)
+    if len(orderings) > cache_size:
+        orderings.popitem(last=False)
+
+    return order, transfers
+
+
+# same candidates as Node.successors (dropping forced leaves), ranked best EU first and beam trimmed,
+# without building the Transfer Nodes: (order, eus, transfers)
+def ranked_successors(node: Node, beam_width: int) -> tuple:
+    metrics: Metrics = Node.metrics
+
+    candidates: list = []
+    eus: list = []
+    transfers: tuple = ()
+    for action_id, action in node.action_map.items():
+        if action_id == 'Transfer':
+            transfers = node.transfer_candidates()
+            candidates.extend(range(len(transfers[0])))
+            eus.extend(BatchedSampler.transfer_eus(node, *transfers).tolist())
+            transfers = transfers[:5]
+
+        elif action.is_viable(node.state):
+            child: Node = Node(node, node.state, action_id)
+            if not child.force_leaf:
+                candidates.append(child)
+                eus.append(child.calc_expected_utility())
+
+        elif metrics:
+            metrics.prune('not_viable')
+
+    # the DFS model pops the best EU first, ties on the last generated
+    # (only the beam is ranked: a partial selection when it is narrower than the candidates)
+    if len(candidates) > beam_width:
+        if metrics:
+            metrics.prune('beam', len(candidates) - beam_width)
+        ranked: list = heapq.nlargest(beam_width, range(len(candidates)), key=lambda i: (eus[i], i))
+    else:
+        ranked = sorted(range(len(candidates)), key=lambda i: (eus[i], i), reverse=True)
+
+    return [candidates[i] for i in ranked], [eus[i] for i in ranked], transfers
+
+
+def build_successor(node: Node, successor, transfers: tuple) -> Node:
+    if isinstance(successor, Node):
+        return successor
+    if isinstance(successor, str):
+        return Node(node, node.state, successor)
+    return Node(node, node.state, 'Transfer',
+                **node.transfer_kwargs(*(a[successor].item() for a in transfers)))
+
+
+'''
+Branch and bound (A*):
+best first on f = EU + an admissible bound on the EU still reachable before the depth limit (Node.calc_a_star, see bound).
+A node can only become a top solution if its EU beats the admission threshold (the soln_size-th best EU so far),
+so successors whose f doesn't are cut along with their whole subtree,
+and the search ends once the best f left in the frontier doesn't either.
+Successors at the depth limit have nothing left to gain (f is their EU), and are cut before their Node is built.
+
+With budgets which aren't reached, the top solutions are those of an exhaustive search (up to ties on EU).
+'''
+
+
+def branch_and_bound(root: Node, depth: int, soln_size: int, max_checks: int, node_limit: int,
+                     beam_width: int, progress: ProgressReporter = None, unique: bool = False) -> tuple:
+
+    metrics: Metrics = Node.metrics
+    top_solutions: TopK = TopK(soln_size, node_schedule_key if unique else None)
+    soln_count: int = 0
+    report: SkipReport = SkipReport(depth)
+
+    # max-heap on f, ties on the most recently pushed
+    frontier: list = []
+    counter = count()
+    heapq.heappush(frontier, (-root.calc_a_star(depth), -next(counter), root))
+
+    if progress:
+        progress.watch(top_solutions, frontier)
+        progress.start()
+
+    stop: str = 'frontier_exhausted'
+    while frontier:
+        if soln_count >= max_checks or Node.id >= node_limit:
+            stop = 'max_solutions' if soln_count >= max_checks else 'max_nodes'
+            break
+
+        # nothing left in the frontier can become a top solution
+        if top_solutions.full() and -frontier[0][0] <= top_solutions.threshold():
+            stop = 'bound'
+            for _, _, node in frontier:
+                report.cut(node.depth)
+            break
+
+        node: Node = heapq.heappop(frontier)[-1]
+
+        soln_count += 1
+        if progress:
+            progress.checked = soln_count
+
+        top_solutions.push(node, node.calc_expected_utility())
+        if node.is_solution(depth):
+            continue
+
+        policy_present = policy.meets_policy(node.state)
+        if policy_present:
+            child: Node = policy.apply_policy(node, policy_present, depth)
+            heapq.heappush(frontier, (-child.calc_a_star(depth), -next(counter), child))
+            if metrics:
+                metrics.prune('policy')
+            continue
+
+        order, eus, transfers = ranked_successors(node, beam_width)
+        report.expanded(node.depth, len(order))
+
+        kept: int = 0
+        for successor, eu in zip(order, eus):
+            threshold: float = top_solutions.threshold()
+
+            # at the depth limit, f is the EU: cut without building the Node
+            # (batched EUs agree with the Node's up to rounding, hence the tolerance)
+            if node.depth + 1 >= depth and eu + 1e-9 <= threshold:
+                report.cut(node.depth + 1)
+                continue
+
+            child: Node = build_successor(node, successor, transfers)
+            f: float = child.calc_a_star(depth)
+            if f <= threshold:
+                report.cut(child.depth)
+                continue
+
+            heapq.heappush(frontier, (-f, -next(counter), child))
+            kept += 1
+
+        if metrics:
+            metrics.prune('bound', len(order) - kept)
+            metrics.expanded(node.depth, kept)
+
+    if metrics:
+        metrics.stop(stop)
+
+    if progress:
+        progress.stop()
+
+    return top_solutions.items(), soln_count, report
+
+
+'''
+Layer-synchronous beam search (BEAM):
+the tree is searched one depth at a time. Every node of the current layer is checked,
+then the successors of the whole layer are scored and only the beam_width best (on EU) across the layer
+are built and kept as the next layer.
+Time and memory per depth are bounded by the beam: at most beam_width nodes are kept per layer,
+and Transfer successors are scored as arrays (see ranked_successors), only the selected ones are built.
+
+The selection is partial (heapq.nlargest), ties on EU go to the earlier parent in the layer, then to its own order.
+'''
+
+
+def beam_search(root: Node, depth: int, soln_size: int, max_checks: int, node_limit: int,
+                beam_width: int, progress: ProgressReporter = None, unique: bool = False) -> tuple:
+
+    metrics: Metrics = Node.metrics
+    top_solutions: TopK = TopK(soln_size, node_schedule_key if unique else None)
+    soln_count: int = 0
+
+    layer: list = [root]  # updated in place, so the progress reporter sees the current layer
+    if progress:
+        progress.watch(top_solutions, layer)
+        progress.start()
+
+    stop: str = None
+    while layer:
+        # (parent, successor, transfers of the parent) and the EU of each successor of the layer
+        candidates: list = []
+        eus: list = []
+
+        for node in layer:
+            if soln_count >= max_checks or Node.id >= node_limit:
+                stop = 'max_solutions' if soln_count >= max_checks else 'max_nodes'
+                break
+
+            soln_count += 1
+            if progress:
+                progress.checked = soln_count
+            top_solutions.push(node, node.calc_expected_utility())
+
+            if node.is_solution(depth):
+                continue
+
+            policy_present = policy.meets_policy(node.state)
+            if policy_present:
+                child: Node = policy.apply_policy(node, policy_present, depth)
+                candidates.append((node, child, ()))
+                eus.append(child.calc_expected_utility())
+                if metrics:
+                    metrics.prune('policy')
+                    metrics.expanded(node.depth, 1)
+                continue
+
+            # no node contributes more than beam_width successors to the next layer
+            order, node_eus, transfers = ranked_successors(node, beam_width)
+            candidates.extend((node, successor, transfers) for successor in order)
+            eus.extend(node_eus)
+            if metrics:
+                metrics.expanded(node.depth, len(order))
+
+        if stop is not None:
+            break
+        if not candidates:
+            stop = 'depth_reached' if layer[0].depth >= depth else 'frontier_exhausted'
+            break
+
+        # global beam over the whole layer
+        if len(candidates) > beam_width:
+            if metrics:
+                metrics.prune('beam', len(candidates) - beam_width)
+            selected = heapq.nlargest(beam_width, range(len(candidates)), key=lambda i: (eus[i], -i))
+        else:
+            selected = range(len(candidates))
+
+        layer[:] = [build_successor(*candidates[i]) for i in selected]
+
+    if metrics:
+        metrics.stop(stop)
+
+    if progress:
+        progress.stop()
+
+    return top_solutions.items(), soln_count
+
+
+'''
+Root-parallel search
+'''
+
+
+# order in which a search pops a node's children: best EU first, ties on the most recently pushed
+def pop_order(children: list) -> list:
+    return sorted(range(len(children)),
+                  key=lambda i: (-children[i].calc_expected_utility(), -i))
+
+
+def parallel_search(root: Node, model: str, depth: int, soln_size: int, max_checks: int, max_nodes: int,
+                    beam_width: int, transposition_size: int = 0, workers: int = 2, split_depth: int = 1,
+                    unique: bool = False, max_memory: int = 0) -> tuple:
+
+    transpositions: TranspositionTable = None
+    if transposition_size > 0:
+        transpositions = TranspositionTable(transposition_size)
+        transpositions.check(root)
+
+    # (ordering key, eu, node or action records) of every candidate solution
+    candidates: list = []
+    soln_count: int = 0
+
+    # expand the first split_depth levels in (depth first) pop order.
+    # ranks are tuples of sibling positions, so sorting them gives the order a serial search pops in
+    subtrees: list = []
+    stack: list = [((), root)]
+    while stack:
+        rank, node = stack.pop()
+        if node.depth >= split_depth:
+            subtrees.append((rank, node))
+            continue
+
+        soln_count += 1
+        candidates.append((rank, node.calc_expected_utility(), node))
+        if node.is_solution(depth):
+            continue
+
+        children: list = expand(node, model, depth, beam_width, transpositions)
+        stack.extend((rank + (pos,), children[i])
+                     for pos, i in reversed(list(enumerate(pop_order(children)))))
+
+    # each subtree gets an even share of the remaining budgets
+    shares: int = max(1, len(subtrees))
+    check_share: int = math.ceil(max(0, max_checks - soln_count) / shares)
+    node_share: int = math.ceil(max(0, max_nodes - Node.id) / shares)
+
+    params: dict = {
+        'model': model,
+        'depth': depth,
+        'soln_size': soln_size,
+        'max_checks': check_share,
+        'max_nodes': node_share,
+        'beam_width': beam_width,
+        'transposition_size': transposition_size,
+        'unique': unique,
+        'max_memory': max_memory // workers,  # per worker process
+        'metrics': Node.metrics is not None,
+    }
+    tasks: list = [(rank, node.schedule, params) for rank, node in subtrees]
+
+    settings: dict = Node.settings()
+    settings['bucket_size'] = BucketFrontier.bucket_size
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(settings,)) as executor:
+        for rank, solutions, checked, generated, metrics in executor.map(search_subtree, tasks):
+            soln_count += checked
+            Node.id += generated
+            if metrics:
+                Node.metrics.merge(metrics)
+            candidates.extend((rank + (pos,), eu, records)
+                              for pos, (eu, records) in enumerate(solutions))
+
+    # pushed in the order a serial search pops them in, so ties are kept the same
+    candidates.sort(key=lambda c: c[0])
+    top_solutions: TopK = TopK(
+        soln_size, candidate_schedule_key if unique else None)
+    for candidate in candidates:
+        top_solutions.push(candidate, candidate[1])
+
+    return [soln if isinstance(soln, Node) else root.replay(soln)
+            for _, _, soln in top_solutions.items()], soln_count
+
+
+def candidate_schedule_key(candidate: tuple) -> str:
+    soln = candidate[-1]
+    return schedule_key(soln.schedule if isinstance(soln, Node) else soln)
+
+
+# worker process state: the root is built once per worker
+worker_root: Node = None
+
+
+def init_worker(settings: dict):
+    global worker_root
+    settings = dict(settings)
+    BucketFrontier.bucket_size = settings.pop('bucket_size')
+    Node.configure(settings)
+
+    # the policy is only ever checked at the root, which the parent has already expanded
+    policy.skip_policy_checks()
+    worker_root = None
+
+
+def search_subtree(task: tuple) -> tuple:
+    global worker_root
+    rank, records, params = task
+    if worker_root is None:
+        worker_root = Node()
+
+    start_id: int = Node.id
+    node: Node = worker_root.replay(records)
+
+    # fresh metrics per subtree, merged into the parent's
+    Node.metrics = Metrics(Node.id) if params['metrics'] else None
+
+    transpositions: TranspositionTable = None
+    if params['transposition_size'] > 0:
+        transpositions = TranspositionTable(params['transposition_size'])
+        transpositions.check(node)
+
+    frontier: Frontier = frontier_map[params['model']](node)
+    if params['max_memory'] > 0:
+        frontier = SpillFrontier(frontier, worker_root, params['max_memory'])
+
+    top_solutions, soln_count = search(frontier, params['model'], params['depth'],
+                                       params['soln_size'], params['max_checks'], Node.id + params['max_nodes'],
+                                       params['beam_width'], transpositions,
+                                       unique=params['unique'])
+
+    if params['max_memory'] > 0:
+        frontier.close()
+
+    solutions: list = [(soln.calc_expected_utility(), [(r.action, r.kwargs, r.factor) for r in soln.schedule])
+                       for soln in top_solutions]
+    return rank, solutions, soln_count, Node.id - start_id, \
+        Node.metrics.state() if Node.metrics else None
@@ -0,0 +1,192 @@
+'''
+
+Memory-Bounded Frontier -
+
+Wraps a search frontier (see frontier), and keeps the process under a memory budget (--max_memory)
+by spilling its lowest priority entries to disk.
+
+Every check_interval pushes, the memory in use (resident set size) is compared against the budget.
+Once it is exceeded, the in-memory frontier is capped (at half its size, halved again if memory keeps growing).
+Whenever the cap is passed, the lowest priority entries (down to 3/4 of the cap) are written to disk as a segment.
+
+Spilled entries are compact: the frontier key, and the action records (action id, kwargs) and node ids
+of the path from the root. The world state is not written, it is rebuilt by replaying the actions from the root
+(actions are deterministic, so the reloaded Node is identical to the spilled one, id included).
+Nodes reloaded together share the ancestors they have in common.
+
+A segment is loaded back once its best entry would be popped next (or the in-memory frontier runs out),
+so nodes are popped in the same order as without a memory budget.
+
+'''
+
+import os
+import pickle
+import tempfile
+
+from node import Node
+from frontier import Frontier
+
+
+# resident set size of this process in bytes (None if it can't be read, ex: not on linux)
+def memory_usage() -> int:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SpillFrontier(Frontier):
+
+    check_interval: int = 1000  # pushes between memory checks
+    min_capacity: int = 1000  # never cap the in-memory frontier below this
+    # estimated memory per frontier entry (a Node and its world state),
+    # used to size the in-memory frontier when the memory in use can't be read
+    entry_bytes: int = 4096
+
+    def __init__(self, frontier: Frontier, root: Node, max_memory: int):
+        self.frontier: Frontier = frontier  # in-memory part
+        self.root: Node = root  # the spilled paths are replayed from
+        self.max_memory: int = max_memory  # bytes
+
+        self.capacity: int = None  # cap on the in-memory frontier, once the budget has been exceeded
+        self.peak_usage: int = 0  # memory in use when the cap was last lowered
+        self.pushes: int = 0
+        if memory_usage() is None:
+            self.capacity = max(SpillFrontier.min_capacity, max_memory // SpillFrontier.entry_bytes)
+
+        self.directory: tempfile.TemporaryDirectory = None
+        self.segments: list = []  # (best key, sequence, file, count)
+        self.sequence: int = 0
+        self.spilled_size: int = 0
+
+        # summary
+        self.spilled: int = 0
+        self.reloaded: int = 0
+        self.spills: int = 0
+        self.reloads: int = 0
+
+        super().__init__()
+
+    def push(self, node: Node):
+        self.frontier.push(node)
+        self.pushed(1)
+
+    def extend(self, nodes):
+        nodes = list(nodes)
+        self.frontier.extend(nodes)
+        self.pushed(len(nodes))
+
+    def pop(self) -> Node:
+        # load back every segment holding an entry which comes before the next in-memory entry
+        while self.segments:
+            segment: tuple = min(self.segments, key=lambda s: (s[0], -s[1]))
+            key = self.frontier.peek()
+            if key is not None and not segment[0] < key:
+                break
+            self.reload(segment)
+
+        return self.frontier.pop()
+
+    def __len__(self) -> int:
+        return len(self.frontier) + self.spilled_size
+
+    def spill(self, n: int) -> list:
+        return self.frontier.spill(n)
+
+    def restore(self, entries: list):
+        self.frontier.restore(entries)
+
+    def peek(self):
+        return self.frontier.peek()
+
+    '''
+    Memory checks
+    '''
+
+    def pushed(self, count: int):
+        self.pushes += count
+        if self.pushes >= SpillFrontier.check_interval:
+            self.pushes = 0
+            self.check_memory()
+
+        if self.capacity is not None and len(self.frontier) > self.capacity:
+            self.write_segment(len(self.frontier) - self.capacity * 3 // 4)
+
+    def check_memory(self):
+        usage: int = memory_usage()
+        if usage is None or usage <= self.max_memory:
+            return
+
+        # freed memory is reused rather than returned to the OS, so only lower the cap if memory keeps growing
+        if self.capacity is None or usage > self.peak_usage:
+            self.capacity = max(SpillFrontier.min_capacity, len(self.frontier) // 2)
+            self.peak_usage = usage
+
+    '''
+    Segments
+    '''
+
+    def write_segment(self, n: int):
+        entries: list = self.frontier.spill(n)
+        if not entries:
+            return
+
+        if self.directory is None:
+            self.directory = tempfile.TemporaryDirectory(prefix='frontier-')
+
+        records: list = []
+        for key, node in entries:
+            path: list = node.path()
+            records.append((key, [(n.record.action, n.record.kwargs) for n in path], [n.id for n in path]))
+
+        segment_file: str = os.path.join(self.directory.name, f'segment{self.sequence}.pickle')
+        with open(segment_file, 'wb') as outfile:
+            pickle.dump(records, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.segments.append((min(key for key, _ in entries), self.sequence, segment_file, len(entries)))
+        self.sequence += 1
+        self.spilled_size += len(entries)
+        self.spilled += len(entries)
+        self.spills += 1
+
+    def reload(self, segment: tuple):
+        self.segments.remove(segment)
+        _, _, segment_file, count = segment
+
+        with open(segment_file, 'rb') as infile:
+            records: list = pickle.load(infile)
+        os.remove(segment_file)
+
+        # rebuilding spilled nodes is not generating new ones: keep Node.id and the metrics untouched
+        node_id, metrics = Node.id, Node.metrics
+        Node.metrics = None
+
+        built: dict = {}  # node id -> rebuilt Node, shared by the paths of this segment
+        entries: list = []
+        for key, actions, ids in records:
+            node: Node = self.root
+            for (action, kwargs), spilled_id in zip(actions, ids):
+                child: Node = built.get(spilled_id)
+                if child is None:
+                    child = built[spilled_id] = Node(node, node.state, action, **kwargs)
+                    child.id = spilled_id
+                node = child
+            entries.append((key, node))
+
+        Node.id, Node.metrics = node_id, metrics
+
+        self.frontier.restore(entries)
+        self.spilled_size -= count
+        self.reloaded += count
+        self.reloads += 1
+
+    def close(self):
+        if self.directory is not None:
+            self.directory.cleanup()
+            self.directory = None
+
+    def summary(self) -> str:
+        return f'Frontier spill: {self.spilled} entries spilled to disk in {self.spills} segments, ' \
+            f'{self.reloaded} reloaded in {self.reloads} loads, ' \
+            f'in-memory cap: {self.capacity if self.capacity is not None else "-"}'
@@ -0,0 +1,68 @@
+'''
+
+Top Solutions -
+
+Bounded collection of the k solutions with the highest Expected Utility,
+shared by main (search), main-stochastic/FlaskApp (rollouts) and the root-parallel merge.
+
+A min-heap keyed on (cached) Expected Utility:
+O(log k) insertion, and an O(1) admission threshold (the EU a new solution must beat once full).
+Ties on Expected Utility keep the solution pushed first (as the sort based list it replaces did).
+
+Optionally drops duplicate schedules (same actions, same arguments), given a dedupe_key function.
+
+'''
+
+import heapq
+from itertools import count
+
+
+# hashable description of a schedule (list of action records), for dropping duplicate schedules
+def schedule_key(records) -> str:
+    return repr([(action, kwargs) for action, kwargs, *_ in records])
+
+
+class TopK:
+
+    def __init__(self, k: int, dedupe_key=None):
+        self.k: int = k
+        self.heap: list = []  # (eu, -counter, item), worst solution first
+        self.counter = count()
+
+        self.dedupe_key = dedupe_key
+        self.keys: set = set()  # dedupe keys of the solutions currently kept
+
+    # EU a new solution must beat to be kept
+    def threshold(self) -> float:
+        return self.heap[0][0] if len(self.heap) >= self.k else float('-inf')
+
+    def full(self) -> bool:
+        return len(self.heap) >= self.k
+
+    # returns whether the solution was kept
+    def push(self, item, eu: float) -> bool:
+        if self.k <= 0 or (self.full() and eu <= self.heap[0][0]):
+            return False
+
+        if self.dedupe_key:
+            key = self.dedupe_key(item)
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+
+        entry: tuple = (eu, -next(self.counter), item)
+        if self.full():
+            removed: tuple = heapq.heapreplace(self.heap, entry)
+            if self.dedupe_key:
+                self.keys.discard(self.dedupe_key(removed[-1]))
+        else:
+            heapq.heappush(self.heap, entry)
+
+        return True
+
+    # kept solutions, best first
+    def items(self) -> list:
+        return [entry[-1] for entry in sorted(self.heap, key=lambda e: (-e[0], -e[1]))]
+
+    def __len__(self) -> int:
+        return len(self.heap)
@@ -0,0 +1,85 @@
+'''
+
+Transposition Table -
+
+Different action orders often reach the same world state
+(ex: trading with Brobdingnag then Carpania, vs. Carpania then Brobdingnag).
+The table remembers the best Expected Utility (and schedule probability) seen for each (state, depth),
+so equivalent nodes are only expanded once.
+
+A duplicate is dropped when a stored copy has an EU at least as good.
+That copy's schedule probability must also be at least as good, otherwise the duplicate could
+still reach successors which the stored copy prunes on Node.sched_threshold.
+So each state keeps the (EU, probability) pairs of the copies none other dominates (a small Pareto set,
+at most max_pairs, dropping the lowest EU first: forgetting a pair only means dropping fewer duplicates).
+
+Keys are a byte digest of every country's resource quantities plus the depth.
+The table is bounded, evicting the least recently used state once full.
+
+'''
+
+import hashlib
+from collections import OrderedDict
+
+from node import Node
+
+
+def state_key(node: Node) -> bytes:
+    digest: bytes = hashlib.blake2b(
+        node.state.as_array().tobytes(), digest_size=16).digest()
+    return node.depth.to_bytes(2, 'little') + digest
+
+
+class TranspositionTable:
+
+    def __init__(self, max_size: int = 100000, max_pairs: int = 8):
+        self.max_size: int = max_size
+        self.max_pairs: int = max_pairs  # (EU, schedule probability) pairs kept per state
+        self.table: OrderedDict = OrderedDict()
+
+        self.hits: int = 0  # state seen before
+        self.misses: int = 0  # new state
+        self.dropped: int = 0  # duplicates dropped, stored copy had an EU at least as good
+        self.replaced: int = 0  # duplicates kept, improving on the stored EU
+        self.evictions: int = 0
+
+    # record the node, returning False if an equivalent state with an EU at least as good was already seen
+    def check(self, node: Node) -> bool:
+        key: bytes = state_key(node)
+        eu: float = node.calc_expected_utility()
+        probability: float = node.calc_schedule_probability()
+
+        stored: list = self.table.get(key)
+        if stored is not None:
+            self.hits += 1
+            self.table.move_to_end(key)
+
+            if any(e >= eu and p >= probability for e, p in stored):
+                self.dropped += 1
+                return False
+
+            # keep the pairs the node doesn't dominate (never a mix of two nodes' EU and probability)
+            stored[:] = [(e, p) for e, p in stored if e > eu or p > probability]
+            stored.append((eu, probability))
+            if len(stored) > self.max_pairs:
+                stored.remove(min(stored))
+            self.replaced += 1
+            return True
+
+        self.misses += 1
+        self.table[key] = [(eu, probability)]
+        if len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+            self.evictions += 1
+
+        return True
+
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def summary(self) -> str:
+        return f'Transposition Table: {len(self.table)}/{self.max_size} states, ' \
+            f'hit rate: {round(100 * self.hit_rate(), 2)}% ' \
+            f'(hits: {self.hits}, misses: {self.misses}), ' \
+            f'dropped: {self.dropped}, replaced: {self.replaced}, evictions: {self.evictions}'
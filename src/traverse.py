@@ -14,12 +14,16 @@ author: Richard White
 import os
 import argparse
 import random
-import copy
-import math
+import time
 import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 import policy
 from node import Node
+from sampler import Sampler, sampler_map
+from topk import TopK, schedule_key
+from metrics import Metrics
 import visualize
 import mathfunctions
 
@@ -28,42 +32,163 @@ Define a Markov Decision Process Traversal of the Node,
 either applying applicable Policies or
 performaning Stocastic Search Behavior weighted by (discounted) Expected Utility
 
+Iterative rollout engine:
+the (shared) root is never modified. Only the current Node and the trace of action records are kept,
+each step detaching the sampled successor from its parent.
+The sampler picks one successor per step (see sampler), so the rollout doesn't need to keep every child.
+Returns the final Node (detached) and the action records which led to it
 '''
 
 
-def traverse_node(node: Node, depth: int) -> Node:
-    if node.is_solution(depth):
-        return node
+def traverse(root: Node, depth: int, sampler: Sampler) -> tuple:
+    metrics: Metrics = Node.metrics
+    node: Node = root
+    trace: list = []
 
-    # Implement Policy Check
-    policy_present = policy.meets_policy(node.state)
+    while not node.is_solution(depth):
 
-    if policy_present and random.random() > 0.5:
-        print("Policy Found")
-        successor = policy.apply_policy(node, policy_present, depth)
-        return traverse_node(successor, depth)
+        # Implement Policy Check
+        policy_present = policy.meets_policy(node.state)
 
-    else:  # No Policy found, so use Stochastic/weighted search
-        children = [n for n in node.generate_successors()
-                    if not n.force_leaf]
-        children.sort(key=lambda n: n.calc_expected_utility())
+        if policy_present and random.random() > 0.5:
+            print("Policy Found")
+            successor = policy.apply_policy(node, policy_present, depth)
+            if metrics:
+                metrics.prune('policy')
 
-        # use expected utility to weight the decision tree, but use EU in terms of
-        weights = [n.calc_expected_utility() for n in children]
+        else:  # No Policy found, so use Stochastic/weighted search
+            start: float = time.perf_counter() if metrics else 0.
+            successor = sampler.sample(node)
+            if metrics:
+                metrics.add_time('sampling', start)
 
-        # calc min weight to use as a shift constant towards a small number
-        try:
-            min_weight = abs(min(weights))
-            weights = [w+min_weight for w in weights]
-            if sum(weights) == 0:
-                weights = [1. for w in weights]
+            if successor is None:
+                print("No successors found")
+                if metrics:
+                    metrics.stop('no_successors')
+                break
 
-        except Exception as e:
-            print(e)
-            return node
+        # the records from the current node, up to the successor (several for a policy)
+        trace.extend(n.record for n in successor.path())
+        successor.parent = None
+        node = successor
 
-        # weighted pseudo-random selection from possible successors
-        successor: Node = random.choices(
-            children, [math.exp(w) for w in weights], k=1)[0]
+    else:
+        if metrics:
+            metrics.stop('depth_reached')
 
-        return traverse_node(successor, depth)
+    return node, trace
+
+
+'''
+Monte Carlo Rollouts:
+Each rollout is an independent traversal from the root, with its own random seed.
+Seeds are derived up front from a base seed, so a run is reproducible whatever the number of workers.
+
+Rollouts are returned as compact results (expected utility, action records) rather than Node trees,
+optionally spread over a process pool (workers > 1).
+Only the schedules kept in the top solutions are replayed from the root.
+
+progress (optional) is updated with the number of rollouts done (see ProgressReporter.checked),
+cancel (optional, a threading/multiprocessing Event) is checked between rollouts:
+once it is set, the remaining rollouts are dropped and the top solutions so far are returned.
+'''
+
+Rollout = namedtuple('Rollout', ['index', 'seed', 'eu', 'records', 'generated'])
+
+
+def rollout_seeds(seed: int, count: int) -> list:
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(count)]
+
+
+def rollout(root: Node, depth: int, index: int, seed: int, sampler: Sampler) -> Rollout:
+    policy.reset_policy_checks()
+    random.seed(seed)
+
+    start_id: int = Node.id
+    soln, trace = traverse(root, depth, sampler)
+    return Rollout(index, seed, soln.calc_expected_utility(),
+                   [(r.action, r.kwargs, r.factor) for r in trace], Node.id - start_id)
+
+
+# worker process state: the root is built once per worker
+worker_root: Node = None
+worker_sampler: Sampler = None
+worker_metrics: bool = False
+
+
+def init_worker(settings: dict, sampler: str, metrics: bool = False):
+    global worker_root, worker_sampler, worker_metrics
+    Node.configure(settings)
+    policy.reload_policy()
+    worker_root = None
+    worker_sampler = sampler_map[sampler]()
+    worker_metrics = metrics
+
+
+# returns the rollout, and its metrics to be merged into the parent's
+def run_rollout(task: tuple) -> tuple:
+    global worker_root
+    depth, index, seed = task
+    if worker_root is None:
+        worker_root = Node()
+
+    Node.metrics = Metrics(Node.id) if worker_metrics else None
+    result: Rollout = rollout(worker_root, depth, index, seed, worker_sampler)
+    return result, Node.metrics.state() if Node.metrics else None
+
+
+def run_rollouts(root: Node, depth: int, max_checks: int, soln_size: int,
+                 workers: int = 1, seed: int = None, sampler: str = 'batched', unique: bool = False,
+                 progress=None, cancel=None) -> list:
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+        print(f"Seed: {seed}")
+
+    seeds: list = rollout_seeds(seed, max_checks)
+    tasks: list = [(depth, i, s) for i, s in enumerate(seeds)]
+
+    top_solutions: TopK = TopK(
+        soln_size, rollout_schedule_key if unique else None)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(Node.settings(), sampler, Node.metrics is not None)) as executor:
+            # results come back in rollout order, so ties are kept the same as a serial run
+            for result, metrics in executor.map(run_rollout, tasks,
+                                                chunksize=max(1, max_checks // (4 * workers))):
+                print(f"Iter: {result.index}")
+                Node.id += result.generated
+                if metrics:
+                    Node.metrics.merge(metrics)
+                top_solutions.push(result, result.eu)
+                if progress:
+                    progress.checked = result.index + 1
+
+                # rollouts already running are finished, the queued ones are dropped
+                if cancel and cancel.is_set():
+                    if Node.metrics:
+                        Node.metrics.stop('cancelled')
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+    else:
+        rollout_sampler: Sampler = sampler_map[sampler]()
+        for _, i, s in tasks:
+            if cancel and cancel.is_set():
+                if Node.metrics:
+                    Node.metrics.stop('cancelled')
+                break
+
+            print(f"Iter: {i}")
+            result: Rollout = rollout(root, depth, i, s, rollout_sampler)
+            top_solutions.push(result, result.eu)
+            if progress:
+                progress.checked = i + 1
+
+    return [root.replay(soln.records) for soln in top_solutions.items()]
+
+
+def rollout_schedule_key(result: Rollout) -> str:
+    return schedule_key(result.records)
@@ -1,9 +1,6 @@
 import os
-import matplotlib.pyplot as plt
 
 import io
-from base64 import encodebytes
-from PIL import Image
 
 from node import Node
 
@@ -11,10 +8,13 @@ from node import Node
 '''
 Visualizations tools for plotting Histograms/State evolutions/tracking over time
 
+matplotlib is only imported when output is actually rendered,
+keeping them off the import path of (headless) searches.
+
 '''
 
 
-def print_schedules(output_dir: str, top_solutions: list, soln_count: int):
+def print_schedules(output_dir: str, top_solutions: list, soln_count: int, plot: bool = True):
     # Search finished: print the top results
     print("Top Solutions: ")
     with open(f'{output_dir}/schedules.txt', 'a+') as output:
@@ -28,16 +28,16 @@ def print_schedules(output_dir: str, top_solutions: list, soln_count: int):
             soln = top_solutions[i]
 
             for prt in [output.write, print]:
-                soln.state.countries[0].printer = prt
                 prt('Schedule:\n')
                 prt(soln.get_schedule())
                 prt(f'quality: {round(soln.calc_quality())}\n')
                 prt(f'expected utility: {round(soln.calc_expected_utility())}')
                 prt(f'State:\n')
-                soln.state.countries[0].print()
+                soln.state.countries[0].print(prt)
                 prt(f'\n')
-                plot_and_save(soln, f'{output_dir}-{i+1}',
-                              f"{output_dir}/schedule{i+1}.png")
+                if plot:
+                    plot_and_save(soln, f'{output_dir}-{i+1}',
+                                  f"{output_dir}/schedule{i+1}.png")
 
 
 def get_schedule_str(node: Node) -> str:
@@ -71,38 +71,28 @@ def get_schedules(top_solutions: list, soln_count) -> str:
     '
 
 
-def print_top_solutions(top_solutions: list, soln_count):
-    '''
-    Render a human readable statistics of the on-going search in progress, including the 'top' results
-
-    '''
-    # windows vs. linux variant
-    os.system('cls')  # os.system('clear')
-
-    print(f'States found: {soln_count}')
+def plot_and_save(node: Node, title: str, output_file: str):
+    with open(output_file, 'wb') as outfile:
+        outfile.write(render_schedule(node, title))
 
-    for soln in top_solutions:
-        print(f'Schedule: ')
-        print(soln.get_schedule())
-        print(f'quality: {round(soln.calc_quality(), 3)}')
-        print(f'expected utility: {round(soln.calc_expected_utility())}')
-        print(f'State:')
-        soln.state.countries[0].print()
-        print('')
 
+# the schedule's chart as PNG bytes, drawn into memory by the Agg backend.
+# the Figure isn't registered with pyplot, so nothing is kept once it is rendered (no figures left open)
+def render_schedule(node: Node, title: str) -> bytes:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-def plot_and_save(node: Node, title: str, output_file: str):
     max_depth = node.depth
 
-    fig, axs = plt.subplots(1, max_depth+1, sharex=True, sharey=True)
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(1, max_depth+1, sharex=True, sharey=True)
     fig.suptitle(f"{title}\nC1:\n{node.get_schedule()}", x=0, ha='left')
 
     for i in range(max_depth+1):
 
-        resources: list = node.state.countries[0].resources
-
-        keys = resources.keys()
-        vals = [r.quantity for r in resources.values()]
+        keys = list(node.state.table.names)
+        vals = node.state.row(0)
 
         axes = axs if max_depth == 0 else axs[max_depth - i]
 
@@ -114,18 +104,10 @@ def plot_and_save(node: Node, title: str, output_file: str):
         axes.set_ylabel("Qty")
         node = node.parent
 
-    # plt.tight_layout()
-    plt.subplots_adjust(top=0.5)
+    # fig.tight_layout()
+    fig.subplots_adjust(top=0.5)
 
-    fig = plt.gcf()
     fig.set_size_inches(18.5, 10.5)
-    fig.savefig(output_file)
-
-
-def get_response_image(image_path):
-    pil_img = Image.open(image_path, mode='r')  # reads the PIL image
     byte_arr = io.BytesIO()
-    pil_img.save(byte_arr, format='PNG')  # convert the PIL image to byte array
-    encoded_img = encodebytes(byte_arr.getvalue()).decode(
-        'ascii')  # encode as base64
-    return encoded_img
+    fig.savefig(byte_arr, format='png')
+    return byte_arr.getvalue()
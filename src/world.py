@@ -1,54 +1,239 @@
-
 '''
 World State Object
+
+Two interchangeable representations of the world are supported:
+
+WorldState:         (default) a list of Country objects, each holding a dict of Resource objects.
+                    Copies are copy-on-write: a copy shares its Country objects with the original,
+                    and only clones the Countries it goes on to mutate.
+
+CompactWorldState:  "compact mode" - the whole world is a single NumPy int matrix (countries x resources)
+                    plus a shared, read-only ResourceTable (names, weights, waste flags).
+                    Copying a compact state is a single small ndarray.copy()
+
+Both expose the same small accessor API (table, row, add, copy, as_array, country_name)
+which Events, Goals and the Quality function are written against.
 '''
+import csv
+import os
+import numpy as np
 from country import Country
 from resource import Resource
-import pandas as pd
 
 
-class WorldState:
+'''
+Resource Table:
+Shared read-only description of the resources in the simulation.
+Resource names are compiled to integer indices once at load,
+so the hot paths (is_viable/apply/progress) index by position rather than by string
+'''
 
-    def __init__(self, init_state_idx: int = 1):
 
-        self.countries: list = []
-        self.resource_template: dict = {}
+class ResourceTable:
+
+    def __init__(self, names: list, weights: list, notes: list):
+        self.names: tuple = tuple(names)
+        self.index: dict = {name: idx for idx, name in enumerate(self.names)}
+        self.notes: tuple = tuple(notes)
+
+        # python floats for scalar math, read-only arrays for vectorized math
+        self.weight_list: list = [float(w) for w in weights]
+        self.weights: np.ndarray = np.array(self.weight_list, dtype=float)
+        self.weights.setflags(write=False)
+
+        # waste resources are denoted with a prime, ex: R21'
+        self.waste_list: list = ["'" in n for n in self.names]
+        self.waste: np.ndarray = np.array(self.waste_list)
+        self.waste.setflags(write=False)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+'''
+Scenario:
+A parsed pair of resource/initial-countries files.
+Countries are built once and shared (read-only) by every WorldState loaded from the scenario.
+
+Parsed scenarios are cached at module level, keyed by file path and modification time,
+so fresh roots are built by copying the cached template rather than re-reading the csv files.
+'''
+
+resources_file: str = 'resources/example-resources.csv'
+countries_file: str = 'resources/example-initial-countries{}.csv'
+
+_scenario_cache: dict = {}
+
+
+class Scenario:
+
+    def __init__(self, resources_path: str, countries_path: str):
 
         # load in resource file
-        df = pd.read_csv('resources/example-resources.csv')
-        resource_cols = ["Resource", "Weight", "Notes"]
         print(f"loading resources file...")
-        for idx, row in df.iterrows():
-            resource_props = dict(
-                zip(resource_cols, [row[v] for v in resource_cols]))
-            self.resource_template[row["Resource"]] = resource_props
-
-        print(self.resource_template)
+        self.resource_template: dict = {}
+        with open(resources_path, newline='') as infile:
+            for row in csv.DictReader(infile):
+                self.resource_template[row["Resource"]] = {
+                    "Resource": row["Resource"],
+                    "Weight": float(row["Weight"]),
+                    "Notes": row["Notes"],
+                }
 
         # load in world state
         print(f"loading countries file...")
+        with open(countries_path, newline='') as infile:
+            reader = csv.reader(infile)
+            header: list = next(reader)
+            rows: list = [row for row in reader if row]
 
-        initial_country_state: str = f'resources/example-initial-countries{init_state_idx}.csv'
-        df = pd.read_csv(initial_country_state)
-        resource_cols = ["R1", "R2", "R3", "R21", "R22",
-                         "R23", "R21'", "R22'", "R23'"]
+        # compile resource names to indices (column order of the countries file)
+        resource_cols: list = header[1:]
+        self.table: ResourceTable = ResourceTable(
+            resource_cols,
+            [self.resource_template[r]["Weight"] for r in resource_cols],
+            [self.resource_template[r]["Notes"] for r in resource_cols])
 
-        for idx, row in df.iterrows():
-            country_name = row['Country']
+        self.country_names: tuple = tuple(row[0] for row in rows)
+        self.quantities: np.ndarray = np.array(
+            [[int(qty) for qty in row[1:]] for row in rows], dtype=np.int64)
+        self.quantities.setflags(write=False)
 
+        self.countries: list = []
+        for name, quantities in zip(self.country_names, self.quantities.tolist()):
             c: Country = Country()
-            c.name = country_name
+            c.name = name
 
             # Countries initial Resources by Quantity
-            for res_name in resource_cols:
-                r: Resource = Resource()
-                r.name = res_name
-                r.quantity = int(row[res_name])
-                r.weight = self.resource_template[res_name]["Weight"]
-                r.descript = self.resource_template[res_name]["Notes"]
+            for res_idx, (res_name, qty) in enumerate(zip(resource_cols, quantities)):
+                r: Resource = Resource(
+                    resource_id=res_idx,
+                    name=res_name,
+                    quantity=qty,
+                    weight=self.resource_template[res_name]["Weight"],
+                    descript=self.resource_template[res_name]["Notes"])
                 c.resources[res_name] = r
 
-            self.countries.append(c)
+            self.countries.append(c.share())
 
         print("Countries Loaded: ")
+
+
+def load_scenario(init_state_idx: int = 1) -> Scenario:
+    resources_path: str = resources_file
+    countries_path: str = countries_file.format(init_state_idx)
+
+    key: tuple = (os.path.abspath(resources_path), os.stat(resources_path).st_mtime_ns,
+                  os.path.abspath(countries_path), os.stat(countries_path).st_mtime_ns)
+
+    scenario: Scenario = _scenario_cache.get(key)
+    if scenario is None:
+        scenario = _scenario_cache[key] = Scenario(
+            resources_path, countries_path)
+
+    return scenario
+
+
+class WorldState:
+
+    def __init__(self, init_state_idx: int = 1):
+        scenario: Scenario = load_scenario(init_state_idx)
+
+        self.table: ResourceTable = scenario.table
+        self.resource_template: dict = scenario.resource_template
+
+        # the scenario's (shared, read-only) countries are cloned on first mutation
+        self.countries: list = list(scenario.countries)
        # self.countries[0].print()
+
+    # quantities of the given country, ordered by resource index
+    def row(self, country_idx: int) -> list:
+        return [r.quantity for r in self.countries[country_idx].resources.values()]
+
+    def add(self, country_idx: int, resource_idx: int, quantity: int):
+        self.mutable_country(country_idx).add(
+            self.table.names[resource_idx], quantity)
+
+    # copy-on-write: clone a shared Country before its first mutation in this state
+    def mutable_country(self, country_idx: int) -> Country:
+        c: Country = self.countries[country_idx]
+        if c.shared:
+            c = self.countries[country_idx] = c.clone()
+        return c
+
+    def country_name(self, country_idx: int) -> str:
+        return self.countries[country_idx].name
+
+    # structural sharing: the copy reuses every Country (now read-only in both states)
+    def copy(self):
+        world: WorldState = WorldState.__new__(WorldState)
+        world.table = self.table
+        world.resource_template = self.resource_template
+        world.countries = [c.share() for c in self.countries]
+        return world
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    # (countries x resources) int matrix of the current quantities
+    def as_array(self) -> np.ndarray:
+        return np.array([self.row(i) for i in range(len(self.countries))], dtype=np.int64)
+
+    def compact(self):
+        return CompactWorldState(self.table,
+                                 [c.name for c in self.countries],
+                                 self.as_array())
+
+
+class CompactWorldState:
+
+    def __init__(self, table: ResourceTable, country_names: list, quantities: np.ndarray):
+        # shared between all copies, never mutated
+        self.table: ResourceTable = table
+        self.country_names: tuple = tuple(country_names)
+
+        # the only per-state data
+        self.quantities: np.ndarray = quantities
+
+    # fresh world state: a copy of the cached scenario template
+    @classmethod
+    def load(cls, init_state_idx: int = 1):
+        scenario: Scenario = load_scenario(init_state_idx)
+        return CompactWorldState(scenario.table,
+                                 scenario.country_names,
+                                 scenario.quantities.copy())
+
+    def row(self, country_idx: int) -> list:
+        return self.quantities[country_idx].tolist()
+
+    def add(self, country_idx: int, resource_idx: int, quantity: int):
+        self.quantities[country_idx, resource_idx] += quantity
+
+    def country_name(self, country_idx: int) -> str:
+        return self.country_names[country_idx]
+
+    def copy(self):
+        return CompactWorldState(self.table, self.country_names, self.quantities.copy())
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def as_array(self) -> np.ndarray:
+        return self.quantities
+
+    # materialize Country/Resource objects (a snapshot, used for printing/visualizing only)
+    @property
+    def countries(self) -> list:
+        countries: list = []
+        for c_idx, name in enumerate(self.country_names):
+            c: Country = Country()
+            c.name = name
+            for r_idx, qty in enumerate(self.row(c_idx)):
+                c.resources[self.table.names[r_idx]] = Resource(
+                    resource_id=r_idx,
+                    name=self.table.names[r_idx],
+                    descript=self.table.notes[r_idx],
+                    quantity=qty,
+                    weight=self.table.weight_list[r_idx])
+            countries.append(c)
+        return countries